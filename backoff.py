@@ -0,0 +1,80 @@
+"""Retry policies for a philosopher that failed to get a chopstick.
+
+A policy is asked ``failed(philosopher, chopstick)`` for how long to wait
+before trying again, is told ``succeeded(philosopher, chopstick)`` after every
+successful acquire and supplies ``acquire_timeout`` for tables that block on a
+semaphore. Philosophers and chopsticks can be any hashable keys: indices in
+the scripts, the sprite objects in the pygame visualizer. ``reset`` is called
+once a philosopher holds everything it needs.
+"""
+from __future__ import annotations
+import random
+
+
+class FixedBackoff:
+    """What the tables always did: a random wait under a second and a one second timeout."""
+
+    def __init__(self, delay=random.random, timeout=1.0):
+        self.delay = delay
+        self.timeout = timeout
+
+    def failed(self, philosopher, chopstick):
+        return self.delay()
+
+    def succeeded(self, philosopher, chopstick):
+        pass
+
+    def reset(self, philosopher):
+        pass
+
+    def acquire_timeout(self, philosopher, chopstick):
+        return self.timeout
+
+
+class ContentionManager:
+    """Exponential backoff with decorrelated jitter, stretched by how contended a chopstick is.
+
+    Every philosopher keeps its previous delay and draws the next one from
+    ``uniform(base, 3 * previous)``, capped at ``cap`` and reset to ``base``
+    once it gets to eat. Each chopstick keeps an exponentially weighted
+    failure rate; waits for a chopstick that fails most of the time are
+    stretched by up to ``1 + contention_weight``.
+
+    The per-chopstick rates are shared between neighbours and updated without
+    a lock; an occasionally lost update only nudges a heuristic.
+    """
+
+    def __init__(self, base=0.01, cap=1.0, smoothing=0.2, contention_weight=1.0, seed=None):
+        self.base = base
+        self.cap = cap
+        self.smoothing = smoothing
+        self.contention_weight = contention_weight
+        self.random = random.Random(seed)
+        self.previous = {}
+        self.failure_rate = {}
+
+    def _observe(self, chopstick, failed):
+        rate = self.failure_rate.get(chopstick, 0.0)
+        self.failure_rate[chopstick] = rate + self.smoothing * (failed - rate)
+
+    def failed(self, philosopher, chopstick):
+        self._observe(chopstick, 1.0)
+        previous = self.previous.get(philosopher, self.base)
+        delay = self.random.uniform(self.base, previous * 3)
+        delay *= 1 + self.contention_weight * self.failure_rate[chopstick]
+        delay = min(self.cap, delay)
+        self.previous[philosopher] = delay
+        return delay
+
+    def succeeded(self, philosopher, chopstick):
+        self._observe(chopstick, 0.0)
+
+    def reset(self, philosopher):
+        self.previous.pop(philosopher, None)
+
+    def acquire_timeout(self, philosopher, chopstick):
+        # Wait about as long as this philosopher would otherwise back off.
+        return min(self.cap, max(self.base, self.previous.get(philosopher, self.base)))
+
+
+POLICIES = {"fixed": FixedBackoff, "adaptive": ContentionManager}
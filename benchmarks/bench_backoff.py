@@ -0,0 +1,77 @@
+"""Compares the fixed retry policy with the adaptive contention manager.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_backoff --philosophers 10 --meals 20 --speedup 50
+
+All sleeps and semaphore timeouts are divided by ``--speedup`` so a run takes
+seconds; reported times are scaled back to simulated seconds.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from backoff import ContentionManager, FixedBackoff
+from simulation import LockTable, SemaphoreTable
+
+
+class _Scaled:
+    """Shrinks a policy's semaphore timeouts to match the sped-up sleeps."""
+
+    def __init__(self, policy, scale):
+        self.policy = policy
+        self.scale = scale
+
+    def failed(self, philosopher, chopstick):
+        return self.policy.failed(philosopher, chopstick)
+
+    def succeeded(self, philosopher, chopstick):
+        self.policy.succeeded(philosopher, chopstick)
+
+    def reset(self, philosopher):
+        self.policy.reset(philosopher)
+
+    def acquire_timeout(self, philosopher, chopstick):
+        return self.policy.acquire_timeout(philosopher, chopstick) * self.scale
+
+
+def run(table_class, policy, n, meals, speedup):
+    scale = 1 / speedup
+    table = table_class(n, meals, backoff=_Scaled(policy, scale),
+                        sleep=lambda seconds: time.sleep(seconds * scale))
+    threads = [threading.Thread(target=table.philosopher, args=(i,)) for i in range(n)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = (time.perf_counter() - start) * speedup
+    attempts = sum(counts[0] for per_philosopher in table.metrics.acquires for counts in per_philosopher.values())
+    failures = sum(counts[1] for per_philosopher in table.metrics.acquires for counts in per_philosopher.values())
+    p99 = table.metrics.hunger_percentiles((99,))[99] * speedup
+    return n * meals / elapsed, failures / attempts, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--philosophers", type=int, default=10)
+    parser.add_argument("--meals", type=int, default=20)
+    parser.add_argument("--speedup", type=float, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    policies = {
+        "fixed": FixedBackoff,
+        "adaptive": ContentionManager,
+    }
+    print(f"{'table':<16}{'policy':<10}{'meals/s':>10}{'fail rate':>11}{'p99 hunger s':>14}")
+    for table_class in (LockTable, SemaphoreTable):
+        for name, policy in policies.items():
+            runs = [run(table_class, policy(), args.philosophers, args.meals, args.speedup) for _ in range(args.repeat)]
+            throughput, failure_rate, p99 = (statistics.median(column) for column in zip(*runs))
+            print(f"{table_class.__name__:<16}{name:<10}{throughput:>10.2f}{failure_rate:>11.1%}{p99:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
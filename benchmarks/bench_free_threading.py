@@ -0,0 +1,90 @@
+"""Compares lock table scaling with and without the GIL as the thread count grows.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_free_threading --python python3.13 python3.13t --threads 2 4 8 16
+
+Every configuration runs in a fresh interpreter. Free-threaded builds are run
+twice, with ``-X gil=1`` and ``-X gil=0``. Thinking, picking up and eating are
+spent as pure Python work instead of sleeping, so the table is CPU bound and
+``cores`` (process CPU time over wall time) shows how many threads really ran
+at once.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from backoff import FixedBackoff
+from simulation import LockTable
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(threads, meals, work):
+    import threading
+
+    def busy(seconds):
+        total = 0
+        for k in range(int(seconds * work)):
+            total += k
+        return total
+
+    table = LockTable(threads, meals, sleep=busy, seed=0, backoff=FixedBackoff(delay=lambda: 0.05))
+    workers = [threading.Thread(target=table.philosopher, args=(i,)) for i in range(threads)]
+    wall, cpu = time.perf_counter(), time.process_time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    print(json.dumps({"gil": gil, "meals_per_s": threads * meals / wall, "cores": cpu / wall}))
+
+
+def free_threaded(python):
+    output = subprocess.run([python, "-c", "import sysconfig; print(sysconfig.get_config_var('Py_GIL_DISABLED') or 0)"],
+                            capture_output=True, text=True, check=True).stdout
+    return output.strip() == "1"
+
+
+def run(python, options, threads, args):
+    output = subprocess.run([python, *options, "-m", "benchmarks.bench_free_threading", "--child",
+                             "--threads", str(threads), "--meals", str(args.meals), "--work", str(args.work)],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--python", nargs="+", default=[sys.executable], help="interpreters to compare")
+    parser.add_argument("--threads", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--meals", type=int, default=10)
+    parser.add_argument("--work", type=int, default=200_000, help="loop iterations per simulated second")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.threads[0], args.meals, args.work)
+        return
+    if min(args.threads) < 2:
+        parser.error("a table needs at least two philosophers")
+    print(f"{'python':<28}{'gil':<6}{'threads':>8}{'meals/s':>10}{'cores':>8}{'scaling':>9}")
+    for python in args.python:
+        modes = [["-X", "gil=1"], ["-X", "gil=0"]] if free_threaded(python) else [[]]
+        for options in modes:
+            baseline = None
+            for threads in args.threads:
+                result = run(python, options, threads, args)
+                # Meals/s per thread relative to the smallest table; 1.0 is perfect scaling.
+                per_thread = result["meals_per_s"] / threads
+                baseline = baseline or per_thread
+                print(f"{os.path.basename(python):<28}{'on' if result['gil'] else 'off':<6}{threads:>8}"
+                      f"{result['meals_per_s']:>10.1f}{result['cores']:>8.2f}{per_thread / baseline:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
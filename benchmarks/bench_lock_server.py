@@ -0,0 +1,94 @@
+"""Compares chopsticks on the lock server with in-process locks.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_lock_server --operations 20000 --depth 64 --clients 4
+
+An operation is one acquire or one release of an uncontended chopstick.
+``round trip`` waits for every reply before sending the next request,
+``pipelined`` sends ``--depth`` requests per write and ``clients`` runs that
+many threads sharing one pooled client, each on its own chopsticks.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from lock_server import LockClient, LockManager, LockServer
+
+
+def in_process(operations):
+    lock = threading.Lock()
+    start = time.perf_counter()
+    for _ in range(operations // 2):
+        lock.acquire(blocking=False)
+        lock.release()
+    return time.perf_counter() - start
+
+
+def manager_only(operations):
+    manager = LockManager()
+    start = time.perf_counter()
+    for _ in range(operations // 2):
+        manager.acquire("owner", ["chopstick/0"], 30.0)
+        manager.release("owner", ["chopstick/0"])
+    return time.perf_counter() - start
+
+
+def round_trip(client, operations, owner="owner", resource="chopstick/0"):
+    start = time.perf_counter()
+    for _ in range(operations // 2):
+        client.acquire(owner, [resource])
+        client.release(owner, [resource])
+    return time.perf_counter() - start
+
+
+def pipelined(client, operations, depth, owner="owner", resource="chopstick/0"):
+    start = time.perf_counter()
+    for _ in range(operations // depth):
+        pipeline = client.pipeline()
+        for _ in range(depth // 2):
+            pipeline.acquire(owner, [resource]).release(owner, [resource])
+        pipeline.execute()
+    return time.perf_counter() - start
+
+
+def concurrent(client, operations, clients):
+    threads = [threading.Thread(target=round_trip, args=(client, operations // clients, f"owner{k}", f"chopstick/{k}"))
+               for k in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=20_000)
+    parser.add_argument("--depth", type=int, default=64, help="requests per pipelined write")
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+    n = args.operations
+
+    def row(name, mode, elapsed):
+        print(f"{name:<12}{mode:<14}{n / elapsed:>12.0f}{elapsed / n * 1e6:>10.2f}")
+
+    print(f"{'chopsticks':<12}{'mode':<14}{'ops/s':>12}{'us/op':>10}")
+    row("Lock", "in process", in_process(n))
+    row("LockManager", "in process", manager_only(n))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, address in (("tcp", ("127.0.0.1", 0)), ("unix", os.path.join(directory, "chopsticks.sock"))):
+            server = LockServer(address).start()
+            client = LockClient(server.address, pool_size=args.clients)
+            row(name, "round trip", round_trip(client, n))
+            row(name, "pipelined", pipelined(client, n, args.depth))
+            row(name, f"{args.clients} clients", concurrent(client, n, args.clients))
+            client.close()
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
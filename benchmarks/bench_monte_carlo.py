@@ -0,0 +1,43 @@
+"""Compares the vectorized Monte Carlo runner with the plain Python loop.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_monte_carlo --tables 50000 --python-tables 500
+
+Both run the same rules, so besides tables per second the estimates should
+agree within their confidence intervals.
+"""
+import argparse
+import time
+
+from monte_carlo import simulate, simulate_python
+
+
+def run(function, tables, args):
+    start = time.perf_counter()
+    trials = function(tables, args.philosophers, args.meals, args.protocol, seed=args.seed)
+    return tables / (time.perf_counter() - start), trials.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--philosophers", type=int, default=5)
+    parser.add_argument("--meals", type=int, default=9)
+    parser.add_argument("--protocol", choices=["lock", "semaphore"], default="lock")
+    parser.add_argument("--tables", type=int, default=50_000)
+    parser.add_argument("--python-tables", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectorized_rate, vectorized = run(simulate, args.tables, args)
+    python_rate, python = run(simulate_python, args.python_tables, args)
+    print(f"{'':<20}{'tables/s':>12}{'steps to finish':>24}{'max hunger':>24}")
+    for name, rate, summary in (("numpy", vectorized_rate, vectorized), ("python", python_rate, python)):
+        steps, hunger = summary["completion_steps"], summary["max_hunger_steps"]
+        print(f"{name:<20}{rate:>12.0f}{steps[0]:>12.1f} ±{steps[2] - steps[0]:>9.1f}"
+              f"{hunger[0]:>12.1f} ±{hunger[2] - hunger[0]:>9.1f}")
+    print(f"speedup {vectorized_rate / python_rate:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,12 @@ from enum import Enum, auto
 import logging
 import random
 import time
+import argparse
+from collections import deque
+
+from backoff import POLICIES
+from resource_graph import ResourceGraph
+from simulation import EventBus, LockTable, PhilosopherEvent
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -25,6 +31,9 @@ MID = 17 * MULTIPLIER
 XS = 240
 YS = 250
 
+# Posted by TableView whenever the simulation has events for the render loop.
+SIMULATION_CHANGED = pygame.event.custom_type()
+
 class ButtonState(Enum):
     START = auto()
     RESTART = auto()
@@ -51,6 +60,10 @@ class BackgroundFurniture(pygame.sprite.Sprite):
 
 
 class Fireplace(pygame.sprite.Sprite):
+    # The flicker runs on the wall clock rather than the frame count, so the
+    # render loop can sleep until the next frame is due.
+    FRAME_SECONDS = 1 / 6
+
     def __init__(self, location, scale_factor=4.0):
         super().__init__()
         self.sprites = [pygame.image.load("assets/fireplace.png"),
@@ -64,14 +77,15 @@ class Fireplace(pygame.sprite.Sprite):
                                                       int(self.sprites[i].get_height() * scale_factor)))
         self.image = self.sprites[0]
         self.rect = self.image.get_rect(center=location)
-        self.sprite_counter = 0
+        self.next_frame = time.monotonic() + self.FRAME_SECONDS
 
-    def update_fire_sprite_to_next(self):
-        # Only update the sprite every 10 frames
-        self.sprite_counter += 1
-        if self.sprite_counter % 10 == 0:
-            self.image = self.sprites[random.randint(0, 3)]
-            self.image.get_rect(center=self.rect.center)
+    def update_fire_sprite_to_next(self, now) -> bool:
+        """Flickers to a random sprite if the next frame is due; returns whether it did."""
+        if now < self.next_frame:
+            return False
+        self.next_frame = now + self.FRAME_SECONDS
+        self.image = self.sprites[random.randint(0, 3)]
+        return True
 
 
 class TableFurniture(pygame.sprite.Sprite):
@@ -119,8 +133,6 @@ class Meal(pygame.sprite.Sprite):
         self.image = self.sprites['full']
 
     def take_a_bite(self):
-        self.image = self.sprites['eating']
-        time.sleep(random.randint(2, 7))
         self.left_to_eat -= 1
         self.image = self.sprites['full']
         if self.left_to_eat == 0:
@@ -157,51 +169,101 @@ class Character(pygame.sprite.Sprite):
         self.direction = "right"
         self.moving = False
         self.speed = 5
-        self.force_stop = False
         self.eating = False
 
         self.meal = Meal()
         self.chopstick_1 = chopstick_1
         self.chopstick_2 = chopstick_2
-
-    def think(self):
-        time.sleep(random.randint(1, 10))
-
-    def eat(self):
-        if self.get_meal().is_finished():
-            return
-        if self.chopstick_1.locked():
-            return
-        self.chopstick_1.acquire()
-        self.get_meal().update_to_half_eating()
-        time.sleep(random.random())
-        if not self.chopstick_2.locked():
-            self.chopstick_2.acquire()
-            time.sleep(random.random())
-            self.eating = True
-            self.meal.take_a_bite()
-            self.chopstick_1.release()
-            self.chopstick_2.release()
-        else:
-            time.sleep(random.random())
-            self.chopstick_1.release()
-            self.get_meal().update_to_full()
+        self.holding = []
 
     def get_meal(self):
         return self.meal
 
-    def start_process(self):
-        while True:
-            self.eat()
-            self.think()
-            if self.meal.is_finished() or self.force_stop:
-                break
+    def pick_up(self, chopstick: Chopstick):
+        chopstick.pick_up()
+        self.holding.append(chopstick)
+        if len(self.holding) == 1:
+            self.meal.update_to_half_eating()
+
+    def start_eating(self):
+        self.eating = True
+        self.meal.update_to_eating()
+
+    def finish_eating(self):
+        self.eating = False
+        self.meal.take_a_bite()
+        self.put_down()
+
+    def give_up(self):
+        self.meal.update_to_full()
+        self.put_down()
+
+    def put_down(self):
+        for chopstick in self.holding:
+            chopstick.put_down()
+        self.holding = []
 
-    def stop_process(self):
-        self.force_stop = True
+    def reset(self):
+        self.eating = False
+        self.put_down()
         self.meal.reset()
 
 
+class TableView:
+    """Applies simulation events to the sprites.
+
+    The event bus pushes batches from its dispatcher thread; the render loop
+    calls ``apply_pending`` so sprites are only ever touched by that loop, and
+    only the philosophers that changed are touched. Each batch also posts
+    ``SIMULATION_CHANGED`` so a render loop asleep in ``pygame.event.wait``
+    wakes up for it straight away.
+    """
+
+    def __init__(self, philosophers: list, chopsticks: list):
+        self.philosophers = philosophers
+        self.chopsticks = chopsticks
+        self.pending = deque()
+        self.wake_posted = False
+
+    def __call__(self, batch):
+        self.pending.append(batch)
+        # One wake-up covers every batch queued before the loop drains them.
+        if not self.wake_posted:
+            self.wake_posted = True
+            pygame.event.post(pygame.event.Event(SIMULATION_CHANGED))
+
+    def apply_pending(self) -> bool:
+        # Cleared before draining, so a batch appended after the drain posts again.
+        self.wake_posted = False
+        changed = False
+        while self.pending:
+            for event in self.pending.popleft():
+                changed = True
+                philosopher = self.philosophers[event.philosopher]
+                if event.kind in (PhilosopherEvent.TOOK_LEFT, PhilosopherEvent.TOOK_RIGHT):
+                    philosopher.pick_up(self.chopsticks[event.chopstick])
+                elif event.kind is PhilosopherEvent.EATING:
+                    philosopher.start_eating()
+                elif event.kind is PhilosopherEvent.DONE:
+                    philosopher.finish_eating()
+                elif event.kind is PhilosopherEvent.DROPPED:
+                    philosopher.give_up()
+        return changed
+
+
+def create_simulation(philosophers: list, bus: EventBus, backoff=None):
+    """Builds the lock table for the seated philosophers and the view that mirrors it."""
+    chopsticks = list(dict.fromkeys(c for p in philosophers for c in (p.chopstick_1, p.chopstick_2)))
+    graph = ResourceGraph.from_resource_sets(
+        [[chopsticks.index(p.chopstick_1), chopsticks.index(p.chopstick_2)] for p in philosophers],
+        len(chopsticks))
+    table = LockTable(len(philosophers), philosophers[0].get_meal().left_to_eat, graph=graph, backoff=backoff,
+                      bus=bus, think_time=lambda: random.randint(1, 10), eat_time=lambda: random.randint(2, 7))
+    view = TableView(philosophers, chopsticks)
+    bus.subscribe(view)
+    return table, view
+
+
 class Text:
     def __init__(self, text, location, font_size=20, font_color=(0, 0, 0)):
         self.text = text
@@ -218,17 +280,11 @@ class Chopstick(pygame.sprite.Sprite):
         self.image = self.sprites['free']
         self.rect = self.image.get_rect(center=location)
         self.original_rect = self.rect
-        self.lock = threading.Lock()
-
-    def locked(self):
-        return self.lock.locked()
 
-    def acquire(self):
-        self.lock.acquire()
+    def pick_up(self):
         self.image = self.sprites['occupied']
 
-    def release(self):
-        self.lock.release()
+    def put_down(self):
         self.image = self.sprites['free']
         self.reset_coordinates()
         # self.image = pygame.transform.scale(self.image, (self.image.get_width()*0.3, self.image.get_height()*0.3))
@@ -309,17 +365,23 @@ class StartGameButton(pygame.sprite.Sprite):
         self.game_state = ButtonState.START
         self.philosophers = []
         self.philosophers_threads = []
+        self.table = None
+        self.bus = None
+        self.view = None
 
-    def start_game(self, philosophers: list):
+    def start_game(self, philosophers: list, backoff=None):
         if self.game_state == ButtonState.START:
             logger.info("Start game button pressed")
             self.game_state = ButtonState.RESTART
             self.image = pygame.image.load("assets/restart.png")
             self.image = pygame.transform.scale(self.image, (self.image.get_width() * 0.1, self.image.get_height() * 0.1))
             self.philosophers = philosophers
+            self.bus = EventBus()
+            self.table, self.view = create_simulation(philosophers, self.bus, backoff)
+            self.bus.start()
 
-            for philosopher in self.philosophers:
-                thread = threading.Thread(target=philosopher.start_process)
+            for i in range(len(self.philosophers)):
+                thread = threading.Thread(target=self.table.philosopher, args=(i,), daemon=True)
                 self.philosophers_threads.append(thread)
 
             for thread in self.philosophers_threads:
@@ -333,10 +395,16 @@ class StartGameButton(pygame.sprite.Sprite):
         self.image = pygame.image.load("assets/start.png")
         self.image = pygame.transform.scale(self.image, (self.image.get_width() * 0.2, self.image.get_height() * 0.2))
         if len(self.philosophers_threads) > 0:
+            # Threads still sleeping finish on their own; their events go nowhere.
+            self.table.stop()
+            self.bus.close(flush=False)
             for philosopher in self.philosophers:
-                philosopher.stop_process()
+                philosopher.reset()
             self.philosophers_threads = []
             self.philosophers = []
+            self.table = None
+            self.bus = None
+            self.view = None
         else:
             logger.error("No philosophers to restart")
 
@@ -345,13 +413,22 @@ class StartGameButton(pygame.sprite.Sprite):
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backoff", choices=sorted(POLICIES), default="fixed",
+                        help="how long to wait before retrying a busy chopstick")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="frame cap; frames are only drawn when something on screen changed")
+    args = parser.parse_args()
+    if args.fps < 1:
+        parser.error("--fps must be at least 1")
+    backoff = POLICIES[args.backoff]()
+
     WIDTH = 800
     HEIGHT = 600
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Dining Philosophers")
     screen.fill((255, 255, 255))
-    clock = pygame.time.Clock()
 
     background_group = pygame.sprite.Group()
     floors = [ BackgroundFurniture("assets/floor.png", (x, y)) for x in range(0, WIDTH+100, 62) for y in range(0, HEIGHT+100, 46)]
@@ -365,6 +442,10 @@ def main():
     background_group_objects.append(BackgroundFurniture("assets/desk.png", (170, 120), 3))
     background_group = pygame.sprite.Group()
     background_group.add(background_group_objects)
+    # The floor and furniture never change, so they are drawn once and every
+    # frame starts from a copy instead of a few hundred tile blits.
+    background = pygame.Surface((WIDTH, HEIGHT)).convert()
+    background_group.draw(background)
     fireplace = Fireplace((WIDTH//2, 60), 4)
 
     ### TABLE ###
@@ -769,69 +850,99 @@ def main():
 
         return meals, philosophers, table_group
 
+    def seat(number):
+        """Loads the position for ``number`` philosophers with the groups the loop draws them from."""
+        meals, philosophers, table_group = load_position(number)
+        philo_number_text = Text(f"Number of Philosophers: {number}", (265,HEIGHT- 10), 20, (255,255,255))
+        return philosophers, table_group, pygame.sprite.Group(meals), pygame.sprite.Group(philosophers), philo_number_text
+
     # Load the default position
-    meals, philosophers, table_group = load_position(5)
+    philosophers, table_group, meal_group, philosopher_group, philo_number_text = seat(5)
+    frame_seconds = 1 / args.fps
+    last_frame = 0.0
+    dirty = True
     while True:
-        for event in pygame.event.get():
+        # Sleep until there is input, a simulation batch or a fireplace frame
+        # due, and while a frame is owed, no later than the frame cap allows.
+        now = time.monotonic()
+        deadline = fireplace.next_frame
+        if dirty:
+            deadline = min(deadline, last_frame + frame_seconds)
+        events = []
+        if deadline > now:
+            # A timeout of 0 would wait forever.
+            events.append(pygame.event.wait(int((deadline - now) * 1000) + 1))
+        events.extend(pygame.event.get())
+
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.display.quit()
                 pygame.quit()
                 sys.exit()
+            if event.type == pygame.WINDOWEXPOSED:
+                dirty = True
             if event.type == pygame.MOUSEBUTTONDOWN:
                 print(pygame.mouse.get_pos())
+                dirty = True
 
                 if number_lock == False:
 
                     if addition.rect.collidepoint(event.pos):
                         addition.change_number()
-                        meals, philosophers, table_group = load_position(addition.number.get_number())
+                        philosophers, table_group, meal_group, philosopher_group, philo_number_text = seat(addition.number.get_number())
 
                     if subtraction.rect.collidepoint(event.pos):
                         subtraction.change_number()
-                        meals, philosophers, table_group = load_position(subtraction.number.get_number())
+                        philosophers, table_group, meal_group, philosopher_group, philo_number_text = seat(subtraction.number.get_number())
 
                 if start_game_button.rect.collidepoint(event.pos):
                     if start_game_button.get_game_state() == ButtonState.START:
-                        start_game_button.start_game(philosophers=philosophers)
+                        start_game_button.start_game(philosophers=philosophers, backoff=backoff)
                         number_lock = True
 
                     elif start_game_button.get_game_state() == ButtonState.RESTART:
                         start_game_button.restart_game()
                         number_lock = False
 
-        # DRAWING ORDER: Background, Table, Title, Meals, Philosophers, Buttons
+        if start_game_button.view is not None and start_game_button.view.apply_pending():
+            dirty = True
+
+        now = time.monotonic()
+        flickered = fireplace.update_fire_sprite_to_next(now)
+        if not dirty or now - last_frame < frame_seconds:
+            if flickered:
+                # Only the fire moved and nothing is drawn over it, so its own
+                # rectangle is repainted and flipped on its own.
+                screen.blit(background, fireplace.rect, fireplace.rect)
+                screen.blit(fireplace.image, fireplace.rect)
+                pygame.display.update(fireplace.rect)
+            continue
+        last_frame = now
+        dirty = False
+
+        # DRAWING ORDER: Background, Fireplace, Table, Title, Meals, Philosophers, Buttons
         # Background objects
-        fireplace.update_fire_sprite_to_next()
-        background_group.add(fireplace)
-        background_group.draw(screen)
+        screen.blit(background, (0, 0))
+        screen.blit(fireplace.image, fireplace.rect)
 
         # Eating Table
         table_group.draw(screen)
 
         # Game title
         screen.blit(title_text.text_surface, title_text.text_rect)
-        philo_number_text = Text(f"Number of Philosophers: {addition.number.get_number()}", (265,HEIGHT- 10), 20, (255,255,255))
         screen.blit(philo_number_text.text_surface, philo_number_text.text_rect)
 
         # Meals of the philosophers
-        meal_group = pygame.sprite.Group()
-        for meal in meals:
-            meal_group.add(meal)
         meal_group.draw(screen)
 
         # Philosophers
-        philosopher_group = pygame.sprite.Group()
-        for philosopher in philosophers:
-            philosopher_group.add(philosopher)
         philosopher_group.draw(screen)
 
         # Game Control Buttons
         addition_group.draw(screen)
         game_state_group.draw(screen)
 
-        # Game Clock
         pygame.display.update()
-        clock.tick(60)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,175 @@
+"""Headless discrete-event engine for very large tables.
+
+``Engine`` runs the ``LockTable`` protocol without threads: a virtual clock, a
+heap with every philosopher's next wake-up and all state in flat arrays. A
+philosopher wakes up to stop thinking, to try its next chopstick, to retry
+after backing off or to finish eating; taking a free chopstick is a single
+step, so the engine sees the protocol without the thread-timing noise.
+
+Because the state is already laid out as arrays, ``checkpoint`` is a set of
+buffer copies and ``from_checkpoint`` resumes a run, including one taken from
+a threaded table.
+"""
+from __future__ import annotations
+from array import array
+import argparse
+import heapq
+import random
+import time
+
+from backoff import FixedBackoff
+from checkpoint import Checkpoint
+from resource_graph import ResourceGraph, ring
+from simulation import Event, EventBus, Phase, PhilosopherEvent
+
+
+class Engine:
+    def __init__(self, graph: ResourceGraph, meal_size=9, seed=None, backoff=None, bus=None):
+        n = graph.number_of_philosophers
+        self.graph = graph
+        self.rng = random.Random(seed)
+        self.backoff = backoff if backoff is not None else FixedBackoff(delay=self.rng.random)
+        self.bus = bus if bus is not None else EventBus()
+        self.now = 0.0
+        self.meals = array('i', [meal_size]) * n
+        self.phases = bytearray(n)
+        self.progress = array('i', bytes(4 * n))
+        self.holders = array('i', [-1]) * graph.number_of_resources
+        random_draw = self.rng.random
+        self.wake = array('d', (random_draw() for _ in range(n)))
+        self._rebuild_heap()
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: Checkpoint, backoff=None, bus=None) -> Engine:
+        """Resumes a run; thinking philosophers due at the checkpoint, as a threaded table leaves them, think first."""
+        engine = cls.__new__(cls)
+        engine.graph = checkpoint.graph
+        engine.rng = random.Random()
+        engine.rng.setstate(checkpoint.rng_state)
+        engine.backoff = backoff if backoff is not None else FixedBackoff(delay=engine.rng.random)
+        engine.bus = bus if bus is not None else EventBus()
+        engine.now = checkpoint.clock
+        engine.meals = array('i', checkpoint.meals)
+        engine.phases = bytearray(checkpoint.phases)
+        engine.progress = array('i', checkpoint.progress)
+        engine.holders = array('i', checkpoint.holders)
+        engine.wake = array('d', checkpoint.wake)
+        for i, phase in enumerate(engine.phases):
+            if phase == Phase.THINKING and engine.wake[i] <= engine.now:
+                engine.wake[i] = engine.now + engine.rng.random()
+        engine._rebuild_heap()
+        return engine
+
+    def _rebuild_heap(self):
+        done = Phase.DONE
+        phases = self.phases
+        self.heap = [(t, i) for i, t in enumerate(self.wake) if phases[i] != done]
+        heapq.heapify(self.heap)
+
+    def checkpoint(self) -> Checkpoint:
+        return Checkpoint(self.now, self.meals, self.phases, self.progress, self.holders, self.wake,
+                          self.rng.getstate(), self.graph)
+
+    def _schedule(self, i, delay):
+        t = self.now + delay
+        self.wake[i] = t
+        heapq.heappush(self.heap, (t, i))
+
+    def _publish(self, i, kind, chopstick=None):
+        if self.bus.subscribers:
+            self.bus.publish(Event(self.now, i, kind, chopstick))
+
+    def step(self):
+        t, i = heapq.heappop(self.heap)
+        self.now = t
+        phases = self.phases
+        if phases[i] == Phase.EATING:
+            self._finish_meal(i)
+            return
+        if phases[i] == Phase.THINKING:
+            phases[i] = Phase.HUNGRY
+            self._publish(i, PhilosopherEvent.HUNGRY)
+        start = self.graph.indptr[i]
+        needed = self.graph.indptr[i + 1] - start
+        k = self.progress[i]
+        if k < needed:
+            chopstick = self.graph.indices[start + k]
+            if self.holders[chopstick] != -1:
+                if k:
+                    self._publish(i, PhilosopherEvent.DROPPED)
+                    for held in self.graph.indices[start:start + k]:
+                        self.holders[held] = -1
+                    self.progress[i] = 0
+                phases[i] = Phase.HUNGRY
+                self._schedule(i, self.backoff.failed(i, chopstick))
+                return
+            self.holders[chopstick] = i
+            self.backoff.succeeded(i, chopstick)
+            k += 1
+            self.progress[i] = k
+            self._publish(i, PhilosopherEvent.TOOK_LEFT if k == 1 else PhilosopherEvent.TOOK_RIGHT, chopstick)
+            if k < needed:
+                phases[i] = Phase.ACQUIRING
+                self._schedule(i, self.rng.random())
+                return
+        self.backoff.reset(i)
+        phases[i] = Phase.EATING
+        self._publish(i, PhilosopherEvent.EATING)
+        self._schedule(i, self.rng.random())
+
+    def _finish_meal(self, i):
+        self.meals[i] -= 1
+        self._publish(i, PhilosopherEvent.DONE)
+        start = self.graph.indptr[i]
+        for held in self.graph.indices[start:self.graph.indptr[i + 1]]:
+            self.holders[held] = -1
+        self.progress[i] = 0
+        if self.meals[i] > 0:
+            self.phases[i] = Phase.THINKING
+            self._schedule(i, self.rng.random())
+        else:
+            self.phases[i] = Phase.DONE
+
+    def run(self, until=None, max_events=None) -> int:
+        """Processes events until the clock passes ``until``, ``max_events`` ran or every meal is eaten."""
+        processed = 0
+        heap = self.heap
+        while heap and (until is None or heap[0][0] <= until) and (max_events is None or processed < max_events):
+            self.step()
+            processed += 1
+            if self.bus.thread is None and processed % 4096 == 0:
+                self.bus.flush()
+        if self.bus.thread is None:
+            self.bus.flush()
+        return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a large table without threads.")
+    parser.add_argument("--philosophers", type=int, default=1_000_000)
+    parser.add_argument("--meals", type=int, default=9)
+    parser.add_argument("--events", type=int, default=1_000_000, help="events to process before stopping")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--resume", metavar="PATH", help="continue from a checkpoint instead of a fresh ring")
+    parser.add_argument("--checkpoint", metavar="PATH", help="write a checkpoint when done")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.resume:
+        engine = Engine.from_checkpoint(Checkpoint.load(args.resume))
+    else:
+        engine = Engine(ring(args.philosophers), args.meals, args.seed)
+    print(f"ready in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    processed = engine.run(max_events=args.events)
+    elapsed = time.perf_counter() - start
+    print(f"{processed} events in {elapsed:.2f}s, simulated clock {engine.now:.2f}s, "
+          f"{sum(engine.meals)} meals left")
+    if args.checkpoint:
+        start = time.perf_counter()
+        engine.checkpoint().save(args.checkpoint)
+        print(f"checkpoint written in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Reproducible interleavings of the threaded tables.
+
+``InterleavingScheduler`` runs the real philosopher threads but lets only one
+of them move at a time. Every chopstick operation and every sleep is a
+scheduling point where the running thread hands control back and a seeded
+random choice picks who goes next. Chopsticks are ``ControlledLock``s that
+block and wake through the scheduler, and time is the number of steps taken,
+so nothing depends on the host's timing: the same seed replays the same
+interleaving, step for step.
+
+Sleep durations are deliberately ignored; which thread runs next is up to the
+seed alone, which is what makes rare orderings come up. A timed acquire that
+gets picked again while its chopstick is still taken has timed out.
+
+``explore`` runs many seeds in worker processes and returns the failing ones;
+``run_schedule`` with the same seed and ``trace=True`` shows what happened.
+"""
+from __future__ import annotations
+from multiprocessing import Pool
+import argparse
+import random
+import threading
+import time
+
+from simulation import LockTable, Phase, SemaphoreTable
+
+
+TABLES = {"lock": LockTable, "semaphore": SemaphoreTable}
+
+
+class ScheduleFailure(Exception):
+    pass
+
+
+class _Abort(BaseException):
+    """Unwinds a philosopher thread whose run was abandoned."""
+
+
+def _baton():
+    # A held Lock works as a binary semaphore any thread may release, and is
+    # much cheaper to hand over than threading.Semaphore.
+    lock = threading.Lock()
+    lock.acquire()
+    return lock
+
+
+class _Task:
+    def __init__(self, index):
+        self.index = index
+        self.go = _baton()
+        self.waiting_on = None
+        self.finished = False
+        self.error = None
+
+
+class ControlledLock:
+    """A chopstick with the ``threading.Lock``/``Semaphore`` interface the tables use."""
+
+    def __init__(self, scheduler, name):
+        self.scheduler = scheduler
+        self.name = name
+        self.owner = None
+
+    def locked(self):
+        self.scheduler.switch("check", self.name)
+        return self.owner is not None
+
+    def acquire(self, blocking=True, timeout=None):
+        scheduler = self.scheduler
+        task = scheduler.current
+        scheduler.switch("acquire", self.name)
+        while self.owner is not None:
+            if not blocking:
+                return False
+            if timeout is not None and timeout >= 0:
+                scheduler.switch("wait", self.name)
+                if self.owner is not None:
+                    return False
+                break
+            task.waiting_on = self
+            scheduler.switch("block", self.name)
+        self.owner = task
+        return True
+
+    def release(self):
+        scheduler = self.scheduler
+        scheduler.switch("release", self.name)
+        if self.owner is None:
+            raise RuntimeError(f"release of unlocked chopstick {self.name}")
+        self.owner = None
+        for task in scheduler.tasks:
+            if task.waiting_on is self:
+                task.waiting_on = None
+
+
+class InterleavingScheduler:
+    """Lets one task run at a time; the task that yields picks its successor and hands it the baton."""
+
+    def __init__(self, seed=None, max_steps=100_000, trace=False):
+        self.rng = random.Random(seed)
+        self.max_steps = max_steps
+        self.steps = 0
+        self.tasks = []
+        self.threads = []
+        self.current = None
+        self.check = None
+        self.failure = None
+        # Released once every task has finished or the run failed.
+        self.control = _baton()
+        self.aborted = False
+        # (step, philosopher, operation, chopstick) when tracing
+        self.trace = [] if trace else None
+
+    def clock(self):
+        return float(self.steps)
+
+    def sleep(self, seconds):
+        self.switch("sleep")
+
+    def new_lock(self, name):
+        return ControlledLock(self, name)
+
+    def spawn(self, target, index):
+        task = _Task(index)
+        self.tasks.append(task)
+
+        def run():
+            task.go.acquire()
+            if self.aborted:
+                return
+            try:
+                target(index)
+            except _Abort:
+                return
+            except BaseException as error:
+                if self.failure is None:
+                    self.failure = ScheduleFailure(f"P{index} raised {error!r}")
+                    self.failure.__cause__ = error
+            task.finished = True
+            self._pass_on()
+
+        thread = threading.Thread(target=run, daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def switch(self, operation, chopstick=None):
+        """Called by the running thread at a scheduling point; returns once it is picked again."""
+        task = self.current
+        if self.trace is not None:
+            self.trace.append((self.steps, task.index, operation, chopstick))
+        self._pass_on()
+        task.go.acquire()
+        if self.aborted:
+            raise _Abort
+
+    def _pass_on(self):
+        if self.failure is None and self.check is not None:
+            try:
+                self.check()
+            except AssertionError as error:
+                self.failure = error
+        if self.failure is None:
+            runnable = [task for task in self.tasks if not task.finished and task.waiting_on is None]
+            if runnable and self.steps < self.max_steps:
+                task = self.current = self.rng.choice(runnable)
+                self.steps += 1
+                task.go.release()
+                return
+            if runnable:
+                self.failure = ScheduleFailure(f"not finished after {self.steps} steps")
+            elif not all(task.finished for task in self.tasks):
+                blocked = ", ".join(f"P{task.index} on {task.waiting_on.name}"
+                                    for task in self.tasks if not task.finished)
+                self.failure = ScheduleFailure(f"deadlock after {self.steps} steps: {blocked}")
+        self.control.release()
+
+    def run(self, check=None):
+        """Lets the tasks take turns until all finish; raises ``ScheduleFailure`` otherwise.
+
+        ``check`` is called between steps, while every task is parked, and
+        fails the run by raising ``AssertionError``.
+        """
+        self.check = check
+        self._pass_on()
+        self.control.acquire()
+        self.aborted = True
+        for task in self.tasks:
+            if not task.finished:
+                task.go.release()
+        for thread in self.threads:
+            thread.join()
+        if self.failure is not None:
+            raise self.failure
+
+
+def controlled_table(table_class, scheduler, number_of_philosophers, meal_size, **kwargs):
+    """Builds ``table_class`` with controlled chopsticks and the scheduler's clock."""
+    class Controlled(table_class):
+        def new_chopstick(self, chopstick):
+            return scheduler.new_lock(chopstick)
+
+    return Controlled(number_of_philosophers, meal_size, sleep=scheduler.sleep, clock=scheduler.clock, **kwargs)
+
+
+def check_table(table):
+    """Invariants that must hold at every step: only users hold a chopstick and neighbours never eat together."""
+    graph = table.graph
+    for c, chopstick in enumerate(table.chopsticks):
+        if chopstick.owner is not None and chopstick.owner.index not in graph.users(c):
+            raise AssertionError(f"P{chopstick.owner.index} holds chopstick {c} it does not use")
+    for i in range(table.number_of_philosophers):
+        if table.phases[i] == Phase.EATING:
+            for c in graph.resources(i):
+                if table.chopsticks[c].owner is None or table.chopsticks[c].owner.index != i:
+                    raise AssertionError(f"P{i} eats without chopstick {c}")
+
+
+def run_schedule(seed, protocol="lock", number_of_philosophers=5, meal_size=2, max_steps=100_000, trace=False):
+    """Runs one seeded interleaving; returns ``(error or None, scheduler)``."""
+    scheduler = InterleavingScheduler(seed, max_steps, trace)
+    table = controlled_table(TABLES[protocol], scheduler, number_of_philosophers, meal_size, seed=seed)
+    for i in range(number_of_philosophers):
+        scheduler.spawn(table.philosopher, i)
+    try:
+        scheduler.run(lambda: check_table(table))
+        if any(table.meals):
+            raise ScheduleFailure(f"meals left over: {table.meals}")
+        held = [c for c, chopstick in enumerate(table.chopsticks) if chopstick.owner is not None]
+        if held:
+            raise ScheduleFailure(f"chopsticks still held at the end: {held}")
+    except (ScheduleFailure, AssertionError) as error:
+        return str(error), scheduler
+    return None, scheduler
+
+
+def _run_seed(job):
+    seed, protocol, number_of_philosophers, meal_size, max_steps = job
+    error, scheduler = run_schedule(seed, protocol, number_of_philosophers, meal_size, max_steps)
+    return seed, error, scheduler.steps
+
+
+def explore(seeds, protocol="lock", number_of_philosophers=5, meal_size=2, max_steps=100_000, workers=1,
+            chunk_size=64):
+    """Runs every seed and returns ``(failures, total steps)`` with failures as sorted ``(seed, error)`` pairs."""
+    jobs = [(seed, protocol, number_of_philosophers, meal_size, max_steps) for seed in seeds]
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = list(pool.imap_unordered(_run_seed, jobs, chunk_size))
+    else:
+        results = [_run_seed(job) for job in jobs]
+    failures = sorted((seed, error) for seed, error, _ in results if error is not None)
+    return failures, sum(steps for _, _, steps in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the threaded tables under seeded interleavings.")
+    parser.add_argument("protocol", choices=sorted(TABLES))
+    parser.add_argument("--philosophers", type=int, default=5)
+    parser.add_argument("--meals", type=int, default=2)
+    parser.add_argument("--schedules", type=int, default=1000)
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=100_000)
+    parser.add_argument("--replay", type=int, metavar="SEED", help="run one seed and print its interleaving")
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        error, scheduler = run_schedule(args.replay, args.protocol, args.philosophers, args.meals,
+                                        args.max_steps, trace=True)
+        for step, philosopher, operation, chopstick in scheduler.trace:
+            print(f"{step:>7} P{philosopher} {operation}" + ("" if chopstick is None else f" {chopstick}"))
+        print(error or f"finished in {scheduler.steps} steps")
+        return
+
+    start = time.perf_counter()
+    seeds = range(args.first_seed, args.first_seed + args.schedules)
+    failures, steps = explore(seeds, args.protocol, args.philosophers, args.meals, args.max_steps, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"{args.schedules} schedules, {steps} steps in {elapsed:.2f}s ({args.schedules / elapsed:.0f} schedules/s)")
+    for seed, error in failures:
+        print(f"seed {seed}: {error}")
+    if not failures:
+        print("no failures")
+
+
+if __name__ == "__main__":
+    main()
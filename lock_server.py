@@ -0,0 +1,453 @@
+"""A chopstick lock manager that philosophers in other processes reach over a socket.
+
+``LockServer`` keeps every chopstick's holder and lease in a ``LockManager``
+and speaks a line protocol over TCP or a Unix socket. Each request is
+``<id> <command> <args>`` and gets a ``<id> <status> [detail]`` reply:
+
+* ``ACQUIRE owner lease wait r1 r2 ...`` takes every listed resource or none
+  of them, waiting up to ``wait`` seconds (``inf`` for ever) -> ``OK`` or ``BUSY r``;
+* ``RELEASE owner r1 r2 ...`` -> ``OK`` or ``NOT_HELD r``;
+* ``RENEW owner lease r1 r2 ...`` extends the leases -> ``OK`` or ``NOT_HELD r``;
+* ``STATS`` -> ``OK held=.. acquired=.. busy=.. expired=..``.
+
+A lease that runs out frees its resources, so a philosopher that dies while
+eating does not block its neighbours for ever. Clients may pipeline: the
+server answers a connection's requests in order and sends the replies to
+everything that arrived together in one write.
+
+``LockClient`` pools connections and ``Pipeline`` batches commands into one
+round trip. ``RemoteLockTable`` and ``RemoteSemaphoreTable`` are the usual
+tables with chopsticks on the server, so each philosopher can run in its own
+process; ``python lock_server.py run`` does exactly that.
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from multiprocessing import Process
+
+from backoff import FixedBackoff
+from resource_graph import ring
+from simulation import LockTable, SemaphoreTable
+
+
+class LockManager:
+    """Holder and lease expiry of every resource; all methods are thread-safe."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # resource -> (owner, lease expiry)
+        self.holders = {}
+        self.acquired = 0
+        self.busy = 0
+        self.expired = 0
+
+    def _holder(self, resource, now):
+        held = self.holders.get(resource)
+        if held is not None and held[1] <= now:
+            del self.holders[resource]
+            self.expired += 1
+            return None
+        return held
+
+    def _try_acquire(self, owner, resources, lease):
+        now = self.clock()
+        for resource in resources:
+            held = self._holder(resource, now)
+            if held is not None and held[0] != owner:
+                return resource, held[1]
+        for resource in resources:
+            self.holders[resource] = (owner, now + lease)
+        return None, None
+
+    def acquire(self, owner, resources, lease, wait=0.0):
+        """Takes all of ``resources`` or none; returns None on success, else a resource that was busy."""
+        deadline = self.clock() + wait
+        with self.lock:
+            while True:
+                busy, expires = self._try_acquire(owner, resources, lease)
+                if busy is None:
+                    self.acquired += 1
+                    return None
+                now = self.clock()
+                if now >= deadline:
+                    self.busy += 1
+                    return busy
+                # Wake up for a release, or when the blocking lease runs out.
+                self.changed.wait(min(deadline, expires) - now)
+
+    def release(self, owner, resources):
+        """Releases whatever of ``resources`` ``owner`` holds; returns the first it did not hold, if any."""
+        missing = None
+        with self.lock:
+            now = self.clock()
+            for resource in resources:
+                held = self._holder(resource, now)
+                if held is None or held[0] != owner:
+                    missing = missing or resource
+                else:
+                    del self.holders[resource]
+            self.changed.notify_all()
+        return missing
+
+    def renew(self, owner, resources, lease):
+        with self.lock:
+            now = self.clock()
+            for resource in resources:
+                held = self._holder(resource, now)
+                if held is None or held[0] != owner:
+                    return resource
+            for resource in resources:
+                self.holders[resource] = (owner, now + lease)
+        return None
+
+    def stats(self):
+        with self.lock:
+            now = self.clock()
+            held = sum(1 for resource in list(self.holders) if self._holder(resource, now) is not None)
+            return f"held={held} acquired={self.acquired} busy={self.busy} expired={self.expired}"
+
+
+class _LockHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        manager = self.server.manager
+        buffer = b""
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            *lines, buffer = (buffer + data).split(b"\n")
+            self.request.sendall(b"".join(_execute(manager, line) for line in lines if line))
+
+
+def _execute(manager, line):
+    words = line.decode().split()
+    if len(words) < 2:
+        return b"? ERROR expected <id> <command>\n"
+    request_id, command, *args = words
+    try:
+        if command == "ACQUIRE":
+            owner, lease, wait, *resources = args
+            failed = manager.acquire(owner, resources, float(lease), float(wait))
+            reply = "OK" if failed is None else f"BUSY {failed}"
+        elif command == "RELEASE":
+            owner, *resources = args
+            failed = manager.release(owner, resources)
+            reply = "OK" if failed is None else f"NOT_HELD {failed}"
+        elif command == "RENEW":
+            owner, lease, *resources = args
+            failed = manager.renew(owner, resources, float(lease))
+            reply = "OK" if failed is None else f"NOT_HELD {failed}"
+        elif command == "STATS":
+            reply = f"OK {manager.stats()}"
+        else:
+            reply = f"ERROR unknown command {command}"
+    except ValueError as error:
+        reply = f"ERROR {error}"
+    return f"{request_id} {reply}\n".encode()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class LockServer:
+    """Serves a ``LockManager`` from a daemon thread at a ``(host, port)`` or a Unix socket path."""
+
+    def __init__(self, address=("127.0.0.1", 0), manager=None):
+        self.manager = manager if manager is not None else LockManager()
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixServer(address, _LockHandler)
+        else:
+            self.server = _TCPServer(address, _LockHandler)
+        self.server.manager = self.manager
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class _Connection:
+    def __init__(self, address):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.connect(address)
+        self.reader = self.socket.makefile("rb")
+        self.next_id = 0
+
+    def call(self, commands):
+        """Sends every ``(command, args)`` in one write and returns their ``(status, detail)`` replies in order."""
+        first = self.next_id
+        self.next_id += len(commands)
+        self.socket.sendall("".join(f"{first + k} {command} {' '.join(args)}\n"
+                                    for k, (command, args) in enumerate(commands)).encode())
+        replies = []
+        for k in range(len(commands)):
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError("lock server closed the connection")
+            request_id, status, *detail = line.decode().split(maxsplit=2)
+            if int(request_id) != first + k:
+                raise ConnectionError(f"reply {request_id} out of order, expected {first + k}")
+            replies.append((status, detail[0].rstrip("\n") if detail else None))
+        return replies
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+
+class LockClient:
+    """Thread-safe client that keeps up to ``pool_size`` connections open and reuses them."""
+
+    def __init__(self, address, pool_size=4):
+        self.address = address
+        self.pool_size = pool_size
+        self.idle = []
+        self.opened = 0
+        # Notified whenever a connection is returned or a slot frees up, so a
+        # caller waiting on a full pool either reuses one or opens its own.
+        self.available = threading.Condition()
+
+    def _checkout(self):
+        with self.available:
+            while not self.idle and self.opened >= self.pool_size:
+                self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.opened += 1
+        try:
+            return _Connection(self.address)
+        except BaseException:
+            self._discard()
+            raise
+
+    def _discard(self):
+        with self.available:
+            self.opened -= 1
+            self.available.notify()
+
+    def call(self, commands):
+        connection = self._checkout()
+        try:
+            replies = connection.call(commands)
+        except BaseException:
+            connection.close()
+            self._discard()
+            raise
+        with self.available:
+            self.idle.append(connection)
+            self.available.notify()
+        return replies
+
+    def acquire(self, owner, resources, lease=30.0, wait=0.0) -> bool:
+        return self.call([_acquire(owner, resources, lease, wait)])[0][0] == "OK"
+
+    def release(self, owner, resources) -> bool:
+        return self.call([("RELEASE", [owner, *map(str, resources)])])[0][0] == "OK"
+
+    def renew(self, owner, resources, lease=30.0) -> bool:
+        return self.call([("RENEW", [owner, repr(float(lease)), *map(str, resources)])])[0][0] == "OK"
+
+    def stats(self) -> str:
+        return self.call([("STATS", [])])[0][1]
+
+    def pipeline(self) -> Pipeline:
+        return Pipeline(self)
+
+    def close(self):
+        with self.available:
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+        for connection in idle:
+            connection.close()
+
+
+def _acquire(owner, resources, lease, wait):
+    return "ACQUIRE", [owner, repr(float(lease)), repr(float(wait)), *map(str, resources)]
+
+
+class Pipeline:
+    """Collects commands and sends them in one round trip; ``execute`` returns whether each succeeded."""
+
+    def __init__(self, client: LockClient):
+        self.client = client
+        self.commands = []
+
+    def acquire(self, owner, resources, lease=30.0, wait=0.0):
+        self.commands.append(_acquire(owner, resources, lease, wait))
+        return self
+
+    def release(self, owner, resources):
+        self.commands.append(("RELEASE", [owner, *map(str, resources)]))
+        return self
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [status == "OK" for status, _ in self.client.call(commands)] if commands else []
+
+
+def owner_token():
+    """Identifies the calling thread across processes and hosts."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class RemoteChopstick:
+    """A chopstick on the lock server with the ``Lock``/``Semaphore`` methods the tables call."""
+
+    def __init__(self, client: LockClient, name=None, lease=30.0):
+        self.client = client
+        self.name = name
+        self.lease = lease
+
+    def acquire(self, blocking=True, timeout=None):
+        if not blocking:
+            wait = 0.0
+        elif timeout is None or timeout < 0:
+            wait = float("inf")
+        else:
+            wait = timeout
+        return self.client.acquire(owner_token(), [self.name], self.lease, wait)
+
+    def release(self):
+        if not self.client.release(owner_token(), [self.name]):
+            raise RuntimeError(f"chopstick {self.name} was not held; did its lease run out?")
+
+
+class _RemoteChopsticks:
+    """Mixed into a table so its chopsticks live on the lock server under ``prefix/<id>``."""
+
+    def __init__(self, client: LockClient, *args, prefix="chopstick", lease=30.0, **kwargs):
+        self.client = client
+        self.prefix = prefix
+        self.lease = lease
+        super().__init__(*args, **kwargs)
+
+    def new_chopstick(self, chopstick):
+        return RemoteChopstick(self.client, f"{self.prefix}/{chopstick}", self.lease)
+
+
+class RemoteLockTable(_RemoteChopsticks, LockTable):
+    pass
+
+
+class RemoteSemaphoreTable(_RemoteChopsticks, SemaphoreTable):
+    pass
+
+
+def _atomic_philosopher(client, resources, meals, sleep, rng):
+    # Both chopsticks in one request: no hold-and-wait, so no deadlock and no
+    # dropping a chopstick after waiting for the other one.
+    owner = owner_token()
+    for _ in range(meals):
+        sleep(rng.random())
+        client.acquire(owner, resources, wait=float("inf"))
+        sleep(rng.random())
+        client.release(owner, resources)
+
+
+def _philosopher_process(address, protocol, n, i, meals, speedup, seed):
+    client = LockClient(address, pool_size=1)
+
+    def sleep(seconds):
+        time.sleep(seconds / speedup)
+
+    if protocol == "atomic":
+        resources = [f"chopstick/{c}" for c in ring(n).resources(i)]
+        _atomic_philosopher(client, resources, meals, sleep, random.Random(seed))
+    else:
+        table_class = RemoteLockTable if protocol == "lock" else RemoteSemaphoreTable
+        # Semaphore timeouts are waits too, so they shrink with the sleeps.
+        table = table_class(client, n, meals, sleep=sleep, seed=seed, backoff=FixedBackoff(timeout=1.0 / speedup))
+        table.philosopher(i)
+    client.close()
+
+
+def run_table(address, protocol="lock", number_of_philosophers=5, meals=5, speedup=1.0, seed=None):
+    """Runs one process per philosopher against the server at ``address``; returns the wall time."""
+    rng = random.Random(seed)
+    processes = [Process(target=_philosopher_process,
+                         args=(address, protocol, number_of_philosophers, i, meals, speedup, rng.random()))
+                 for i in range(number_of_philosophers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    failed = [i for i, process in enumerate(processes) if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"philosopher processes {failed} failed")
+    return time.perf_counter() - start
+
+
+def _address(args):
+    return args.unix if args.unix else (args.host, args.port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chopstick lock server and a table of philosopher processes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run a lock server until interrupted")
+    run = commands.add_parser("run", help="run one process per philosopher against a lock server")
+    for command in (serve, run):
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=7464)
+        command.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    run.add_argument("--connect", action="store_true", help="use a running server instead of starting one")
+    run.add_argument("--protocol", choices=["lock", "semaphore", "atomic"], default="lock")
+    run.add_argument("--philosophers", type=int, default=5)
+    run.add_argument("--meals", type=int, default=5)
+    run.add_argument("--speedup", type=float, default=20.0, help="divide every sleep by this")
+    run.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = LockServer(_address(args)).start()
+        print(f"serving chopsticks on {server.address}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            server.stop()
+        return
+
+    server = None if args.connect else LockServer(_address(args)).start()
+    address = _address(args) if server is None else server.address
+    elapsed = run_table(address, args.protocol, args.philosophers, args.meals, args.speedup, args.seed)
+    print(f"{args.philosophers * args.meals} meals in {elapsed:.2f}s "
+          f"({args.philosophers * args.meals / elapsed:.1f} meals/s)")
+    client = LockClient(address)
+    print(f"server: {client.stats()}")
+    client.close()
+    if server is not None:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""Exhaustive state-space explorer for the philosopher protocols on a ring.
+
+Each protocol is written down as a small state machine over program counters
+that mirrors the statements of the real code, so the checker sees the same
+windows the threads do (for example between ``locked()`` and ``acquire()``
+in the ``check-then-lock`` protocol the lock table used to run).
+A global state packs every philosopher's program counter and remaining meals
+into one integer, ``width`` bits per philosopher; which chopsticks are held
+follows from the program counters.
+
+``find_deadlock`` explores the quotient of the state space under rotation of
+the ring and can expand each BFS level in worker processes. ``find_livelock``
+and ``find_starvation`` look for reachable cycles that are strongly fair
+(a philosopher that is able to move somewhere on the cycle does move on it)
+and in which nobody, or philosopher 0, ever eats. By symmetry philosopher 0
+stands in for all of them. Every witness is a list of ``(philosopher, label)``
+steps that ``replay`` re-executes from the initial state.
+"""
+from __future__ import annotations
+import argparse
+from collections import deque
+from multiprocessing import Pool
+import time
+
+
+class Protocol:
+    def __init__(self, name, pc_names, initial_pc, loop_top, hold_first, hold_second, transitions):
+        self.name = name
+        self.pc_names = pc_names
+        self.pc_bits = (len(pc_names) - 1).bit_length()
+        self.initial_pc = initial_pc
+        self.loop_top = loop_top
+        self.done = pc_names.index('done')
+        self.hold_first = frozenset(hold_first)
+        self.hold_second = frozenset(hold_second)
+        # (pc, first busy, second busy) -> (next pc, finished a meal, label); missing means blocked
+        self.table = {}
+        for pc, outcomes in transitions.items():
+            for first_busy in (False, True):
+                for second_busy in (False, True):
+                    outcome = outcomes(first_busy, second_busy)
+                    if outcome is not None:
+                        next_pc, ate, label = outcome
+                        self.table[pc, first_busy, second_busy] = (pc_names.index(next_pc), ate, label)
+
+    def __repr__(self) -> str:
+        return f"Protocol({self.name!r})"
+
+
+def _lock_protocol():
+    # LockTable.take: a non-blocking acquire() either takes the chopstick or
+    # reports it busy; a hungry philosopher backs off and retries until it gets to eat.
+    names = ['think', 'hungry', 'unused_2', 'has_left', 'unused_4', 'releasing', 'eating', 'done', 'dropping']
+    return Protocol('lock', names, 0, 0, hold_first=[3, 5, 6, 8], hold_second=[6], transitions={
+        0: lambda lb, rb: ('hungry', False, 'hungry'),
+        1: lambda lb, rb: ('hungry', False, 'left-busy') if lb else ('has_left', False, 'take-left'),
+        3: lambda lb, rb: ('dropping', False, 'right-busy') if rb else ('eating', False, 'take-right'),
+        5: lambda lb, rb: ('think', False, 'release-left'),
+        6: lambda lb, rb: ('releasing', True, 'eat'),
+        8: lambda lb, rb: ('hungry', False, 'drop-left'),
+    })
+
+
+def _check_then_lock_protocol():
+    # The original w_lock code: check locked(), then a blocking acquire(). The
+    # chopstick can be taken in between, which the GIL only makes less likely.
+    names = ['think', 'hungry', 'left_checked', 'has_left', 'right_checked', 'releasing', 'eating', 'done',
+             'dropping']
+    return Protocol('check-then-lock', names, 0, 0, hold_first=[3, 4, 5, 6, 8], hold_second=[6], transitions={
+        0: lambda lb, rb: ('hungry', False, 'hungry'),
+        1: lambda lb, rb: ('hungry', False, 'left-busy') if lb else ('left_checked', False, 'left-free'),
+        2: lambda lb, rb: None if lb else ('has_left', False, 'take-left'),
+        3: lambda lb, rb: ('dropping', False, 'right-busy') if rb else ('right_checked', False, 'right-free'),
+        4: lambda lb, rb: None if rb else ('eating', False, 'take-right'),
+        5: lambda lb, rb: ('think', False, 'release-left'),
+        6: lambda lb, rb: ('releasing', True, 'eat'),
+        8: lambda lb, rb: ('hungry', False, 'drop-left'),
+    })
+
+
+def _semaphore_protocol():
+    # SemaphoreTable.take: acquire(timeout=...) either succeeds or gives up
+    names = ['think', 'hungry', 'unused_2', 'has_left', 'unused_4', 'releasing', 'eating', 'done', 'dropping']
+    return Protocol('semaphore', names, 0, 0, hold_first=[3, 5, 6, 8], hold_second=[6], transitions={
+        0: lambda lb, rb: ('hungry', False, 'hungry'),
+        1: lambda lb, rb: ('hungry', False, 'left-timeout') if lb else ('has_left', False, 'take-left'),
+        3: lambda lb, rb: ('dropping', False, 'right-timeout') if rb else ('eating', False, 'take-right'),
+        5: lambda lb, rb: ('think', False, 'release-left'),
+        6: lambda lb, rb: ('releasing', True, 'eat'),
+        8: lambda lb, rb: ('hungry', False, 'drop-left'),
+    })
+
+
+PROTOCOLS = {p.name: p for p in (_lock_protocol(), _check_then_lock_protocol(), _semaphore_protocol())}
+
+
+class Model:
+    """A protocol on a ring of ``n`` philosophers with ``meals`` meals each (None for unbounded)."""
+
+    def __init__(self, protocol, n, meals=None):
+        if n < 2:
+            raise ValueError("need at least two philosophers")
+        self.protocol = PROTOCOLS[protocol] if isinstance(protocol, str) else protocol
+        self.n = n
+        self.meals = meals
+        self.meal_bits = meals.bit_length() if meals else 0
+        self.width = self.protocol.pc_bits + self.meal_bits
+        self.field_mask = (1 << self.width) - 1
+        self.pc_mask = (1 << self.protocol.pc_bits) - 1
+        self.mask = (1 << (self.width * n)) - 1
+        field = self.protocol.initial_pc | ((meals or 0) << self.protocol.pc_bits)
+        self.initial = sum(field << (i * self.width) for i in range(n))
+
+    def pcs(self, state):
+        return [(state >> (i * self.width)) & self.pc_mask for i in range(self.n)]
+
+    def describe(self, state):
+        names = self.protocol.pc_names
+        return " ".join(names[pc] for pc in self.pcs(state))
+
+    def all_done(self, state):
+        return all(pc == self.protocol.done for pc in self.pcs(state))
+
+    def successors(self, state):
+        """Returns ``(next state, philosopher, ate, label)`` for every enabled step."""
+        protocol = self.protocol
+        width = self.width
+        fields = [(state >> (i * width)) & self.field_mask for i in range(self.n)]
+        pcs = [field & self.pc_mask for field in fields]
+        steps = []
+        for i, pc in enumerate(pcs):
+            if pc == protocol.done:
+                continue
+            first_busy = pcs[i - 1] in protocol.hold_second
+            second_busy = pcs[(i + 1) % self.n] in protocol.hold_first
+            outcome = protocol.table.get((pc, first_busy, second_busy))
+            if outcome is None:
+                continue
+            next_pc, ate, label = outcome
+            meals = fields[i] >> protocol.pc_bits
+            if ate and self.meal_bits:
+                meals -= 1
+            if next_pc == protocol.loop_top and self.meal_bits and meals == 0:
+                next_pc = protocol.done
+            field = next_pc | (meals << protocol.pc_bits)
+            steps.append((state ^ ((fields[i] ^ field) << (i * width)), i, ate, label))
+        return steps
+
+    def canonical(self, state):
+        """Returns the smallest rotation of ``state`` and by how many seats it was rotated."""
+        best, best_shift = state, 0
+        width = self.width
+        spill = width * (self.n - 1)
+        for shift in range(1, self.n):
+            state = ((state >> width) | (state << spill)) & self.mask
+            if state < best:
+                best, best_shift = state, shift
+        return best, best_shift
+
+
+class Witness:
+    def __init__(self, kind, prefix, cycle=()):
+        self.kind = kind
+        self.prefix = list(prefix)
+        self.cycle = list(cycle)
+
+    def steps(self):
+        return self.prefix + self.cycle
+
+    def __str__(self) -> str:
+        lines = [f"{self.kind}:"]
+        lines.extend(f"  P{i}: {label}" for i, label in self.prefix)
+        if self.cycle:
+            lines.append("  -- repeat forever --")
+            lines.extend(f"  P{i}: {label}" for i, label in self.cycle)
+        return "\n".join(lines)
+
+
+def replay(model: Model, steps):
+    """Re-executes ``steps`` from the initial state and returns every state visited."""
+    state = model.initial
+    states = [state]
+    for philosopher, label in steps:
+        for next_state, i, _, step_label in model.successors(state):
+            if i == philosopher and step_label == label:
+                state = next_state
+                break
+        else:
+            raise ValueError(f"P{philosopher} cannot '{label}' in state {model.describe(state)}")
+        states.append(state)
+    return states
+
+
+_worker_model = None
+
+
+def _init_worker(protocol, n, meals):
+    global _worker_model
+    _worker_model = Model(protocol, n, meals)
+
+
+def _expand(states, model=None):
+    model = model or _worker_model
+    expanded = []
+    for state in states:
+        children = []
+        for child, i, _, label in model.successors(state):
+            canonical, shift = model.canonical(child)
+            children.append((canonical, i, shift, label))
+        expanded.append((state, children))
+    return expanded
+
+
+def find_deadlock(model: Model, workers=1, chunk_size=2048):
+    """Breadth-first search of the rotation quotient; returns ``(witness or None, states explored)``."""
+    parents = {model.initial: None}
+    frontier = [model.initial]
+    pool = Pool(workers, _init_worker, (model.protocol.name, model.n, model.meals)) if workers > 1 else None
+    try:
+        while frontier:
+            chunks = [frontier[k:k + chunk_size] for k in range(0, len(frontier), chunk_size)]
+            results = pool.imap(_expand, chunks) if pool else (_expand(chunk, model) for chunk in chunks)
+            frontier = []
+            for expanded in results:
+                for state, children in expanded:
+                    if not children and not model.all_done(state):
+                        return Witness("deadlock", _unrotate(model, parents, state)), len(parents)
+                    for canonical, i, shift, label in children:
+                        if canonical not in parents:
+                            parents[canonical] = (state, i, shift, label)
+                            frontier.append(canonical)
+    finally:
+        if pool:
+            pool.terminate()
+    return None, len(parents)
+
+
+def _unrotate(model, parents, state):
+    edges = []
+    while parents[state] is not None:
+        parent, i, shift, label = parents[state]
+        edges.append((i, shift, label))
+        state = parent
+    steps = []
+    offset = 0
+    for i, shift, label in reversed(edges):
+        steps.append(((i + offset) % model.n, label))
+        offset = (offset + shift) % model.n
+    return steps
+
+
+def _explore(model):
+    parents = {model.initial: None}
+    queue = deque([model.initial])
+    while queue:
+        state = queue.popleft()
+        for child, i, _, label in model.successors(state):
+            if child not in parents:
+                parents[child] = (state, i, label)
+                queue.append(child)
+    return parents
+
+
+def _path_to(parents, state):
+    steps = []
+    while parents[state] is not None:
+        parent, i, label = parents[state]
+        steps.append((i, label))
+        state = parent
+    steps.reverse()
+    return steps
+
+
+def _components(states, edges):
+    """Iterative Tarjan over ``edges(state) -> [(next state, philosopher, ate, label)]``."""
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    for root in states:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges(root)))]
+        while work:
+            v, successors = work[-1]
+            for w, *_ in successors:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(edges(w))))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    yield component
+
+
+def _fair_components(model, states, edges):
+    """Yields ``(component, internal edges)`` for every strongly fair component within ``states``.
+
+    A philosopher that is enabled somewhere in a component must also move
+    inside it; otherwise the states where it is enabled are cut away and what
+    remains is searched again.
+    """
+    def inside(state):
+        return [edge for edge in edges(state) if edge[0] in states]
+
+    for component in _components(states, inside):
+        members = set(component)
+        internal = {state: [edge for edge in inside(state) if edge[0] in members] for state in component}
+        if not any(internal.values()):
+            continue
+        moving = {edge[1] for moves in internal.values() for edge in moves}
+        unfair = set()
+        for k in range(model.n):
+            if k in moving:
+                continue
+            unfair.update(state for state in component
+                          if any(step[1] == k for step in model.successors(state)))
+            if unfair:
+                break
+        if unfair:
+            yield from _fair_components(model, members - unfair, edges)
+        else:
+            yield component, internal
+
+
+def _fair_cycle(model, component, internal, need_meal):
+    """Returns a cycle through ``component`` in which every philosopher that can move does."""
+    targets = {}
+    meal = None
+    for state in component:
+        for edge in internal[state]:
+            targets.setdefault(edge[1], (state, edge))
+            if edge[2] and meal is None:
+                meal = (state, edge)
+    if need_meal != (meal is not None):
+        return None
+    targets = list(targets.values()) + ([meal] if meal else [])
+    start = targets[0][0]
+    cycle = []
+    current = start
+    for state, move in targets + [(start, None)]:
+        cycle.extend(_walk(internal, current, state))
+        current = state
+        if move is not None:
+            cycle.append((move[1], move[3]))
+            current = move[0]
+    return start, cycle
+
+
+def _walk(internal, source, target):
+    if source == target:
+        return []
+    parents = {source: None}
+    queue = deque([source])
+    while queue:
+        state = queue.popleft()
+        for child, i, _, label in internal[state]:
+            if child not in parents:
+                parents[child] = (state, i, label)
+                if child == target:
+                    return _path_to(parents, child)
+                queue.append(child)
+    raise RuntimeError("target is not reachable inside the component")
+
+
+def _find_cycle(model, kind, edges, need_meal, parents=None):
+    parents = parents or _explore(model)
+    for component, internal in _fair_components(model, set(parents), edges):
+        found = _fair_cycle(model, component, internal, need_meal)
+        if found is not None:
+            start, cycle = found
+            return Witness(kind, _path_to(parents, start), cycle)
+    return None
+
+
+def find_livelock(model: Model, parents=None):
+    """A fair cycle in which nobody ever finishes a meal."""
+    def edges(state):
+        return [edge for edge in model.successors(state) if not edge[2]]
+    return _find_cycle(model, "livelock", edges, need_meal=False, parents=parents)
+
+
+def find_starvation(model: Model, parents=None):
+    """A fair cycle in which others keep eating but philosopher 0 never does."""
+    def edges(state):
+        return [edge for edge in model.successors(state) if not (edge[2] and edge[1] == 0)]
+    return _find_cycle(model, "starvation of P0", edges, need_meal=True, parents=parents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explore every interleaving of a philosopher protocol.")
+    parser.add_argument("protocol", choices=sorted(PROTOCOLS))
+    parser.add_argument("n", type=int, help="number of philosophers")
+    parser.add_argument("--meals", type=int, help="meals per philosopher (default: unbounded)")
+    parser.add_argument("--workers", type=int, default=1, help="processes used for the deadlock search")
+    parser.add_argument("--no-liveness", action="store_true", help="only search for deadlocks")
+    args = parser.parse_args()
+
+    model = Model(args.protocol, args.n, args.meals)
+    start = time.perf_counter()
+    deadlock, explored = find_deadlock(model, args.workers)
+    print(f"{explored} states up to rotation explored in {time.perf_counter() - start:.1f}s")
+    print(deadlock or "no deadlock")
+    if args.no_liveness:
+        return
+    start = time.perf_counter()
+    parents = _explore(model)
+    print(f"{len(parents)} states explored in {time.perf_counter() - start:.1f}s")
+    print(find_livelock(model, parents) or "no livelock")
+    if args.meals is None:
+        print(find_starvation(model, parents) or "no starvation")
+
+
+if __name__ == "__main__":
+    main()
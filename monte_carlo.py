@@ -0,0 +1,279 @@
+"""Vectorized Monte Carlo runs of many independent ring tables at once.
+
+Time advances in ticks and every table moves in lockstep: state lives in
+``(tables, philosophers)`` NumPy arrays and each tick applies the think,
+try-left, try-right, eat and release transitions to all of them with masks.
+Phase lengths are geometric (a thinking philosopher gets hungry with
+probability ``think`` per tick, and so on). When two neighbours reach for the
+same free chopstick in the same tick a random draw decides who gets it.
+
+``protocol="lock"`` gives up on a busy right chopstick at once, like
+``LockTable``; ``protocol="semaphore"`` keeps the left one for up to
+``timeout`` ticks first, like ``SemaphoreTable`` (``timeout=None`` waits
+forever, which can deadlock). ``simulate_python`` runs the same rules one
+table at a time in plain Python as a reference.
+"""
+from __future__ import annotations
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+
+THINKING, HUNGRY, HAS_LEFT, EATING, DONE = range(5)
+
+
+class Trials:
+    """Per-table outcomes of a batch of runs."""
+
+    def __init__(self, steps, deadlocked, max_hunger, failures, n, meal_size):
+        self.steps = np.asarray(steps)
+        self.deadlocked = np.asarray(deadlocked, dtype=bool)
+        self.max_hunger = np.asarray(max_hunger)
+        self.failures = np.asarray(failures)
+        self.n = n
+        self.meal_size = meal_size
+
+    def __len__(self):
+        return len(self.steps)
+
+    def summary(self, hunger_threshold=100, z=1.96) -> dict:
+        """Point estimates with ``z``-sigma confidence intervals as ``(value, low, high)``."""
+        finished = ~self.deadlocked & (self.steps >= 0)
+        throughput = self.n * self.meal_size / self.steps[finished] if finished.any() else np.zeros(0)
+        return {
+            "tables": len(self),
+            "completion_steps": _mean_interval(self.steps[finished], z),
+            "meals_per_step": _mean_interval(throughput, z),
+            "max_hunger_steps": _mean_interval(self.max_hunger, z),
+            "failed_attempts": _mean_interval(self.failures, z),
+            "p_deadlock": _wilson(int(self.deadlocked.sum()), len(self), z),
+            f"p_hunger_over_{hunger_threshold}": _wilson(int((self.max_hunger > hunger_threshold).sum()), len(self), z),
+        }
+
+
+def _mean_interval(values, z):
+    if len(values) == 0:
+        return (math.nan, math.nan, math.nan)
+    mean = float(np.mean(values))
+    half = z * float(np.std(values, ddof=1)) / math.sqrt(len(values)) if len(values) > 1 else math.inf
+    return (mean, mean - half, mean + half)
+
+
+def _wilson(successes, trials, z):
+    if trials == 0:
+        return (math.nan, math.nan, math.nan)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return (p, max(0.0, centre - half), min(1.0, centre + half))
+
+
+def _wait_limit(protocol, timeout):
+    if protocol == "lock":
+        return 0
+    if protocol == "semaphore":
+        return timeout
+    raise ValueError(f"unknown protocol {protocol!r}")
+
+
+def simulate(tables, n, meal_size=9, protocol="lock", think=0.2, eat=0.2, pickup=0.5, retry=0.5,
+             timeout=10, max_steps=100_000, seed=None) -> Trials:
+    """Runs ``tables`` independent tables of ``n`` philosophers until each has eaten every meal."""
+    if n < 2:
+        raise ValueError("need at least two philosophers")
+    wait_limit = _wait_limit(protocol, timeout)
+    forever = wait_limit is None
+    if forever:
+        wait_limit = np.iinfo(np.int32).max
+    rng = np.random.default_rng(seed)
+    think, eat, pickup, retry = (round(p * 65536) for p in (think, eat, pickup, retry))
+
+    def zeros(dtype):
+        # Column-major, so every philosopher's column is contiguous and rolling
+        # around the table is a handful of block copies.
+        return np.zeros((tables, n), dtype=dtype, order='F')
+
+    # One mask per phase; a philosopher holds its left chopstick in has_left
+    # and eating, and its right one only while eating.
+    thinking = ~zeros(bool)
+    hungry, has_left, eating = zeros(bool), zeros(bool), zeros(bool)
+    waited, hunger, failures = zeros(np.int32), zeros(np.int32), zeros(np.int32)
+    meals = zeros(np.int32) + meal_size
+    max_hunger = np.zeros(tables, dtype=np.int32)
+    # Finished tables stay in the arrays, frozen, until enough of them pile up
+    # to be worth compacting away; rows maps each row back to its table.
+    rows = np.arange(tables)
+    live = np.ones(tables, dtype=bool)
+    steps = np.full(tables, -1, dtype=np.int64)
+    deadlocked = np.zeros(tables, dtype=bool)
+    out_max_hunger = np.zeros(tables, dtype=np.int32)
+    out_failures = np.zeros(tables, dtype=np.int64)
+
+    for step in range(1, max_steps + 1):
+        width = len(rows)
+        # Raw 64-bit words cut into 16-bit draws are much cheaper than floats.
+        bits = rng.bit_generator.random_raw((width * n + 1) // 2).view(np.uint16)
+        draw, priority = bits[:2 * width * n].reshape(2, n, width).transpose(0, 2, 1)
+
+        finished = eating & (draw < eat)
+        meals -= finished
+        eating &= ~finished
+        became_hungry = thinking & (draw < think)
+        thinking &= ~became_hungry
+        thinking |= finished & (meals > 0)
+
+        # Chopstick c is philosopher c's left and philosopher c-1's right.
+        free = ~(has_left | eating | np.roll(eating, 1, axis=1))
+        try_left = hungry & (draw < retry)
+        try_right = has_left & ((waited > 0) | (draw < pickup))
+        right_on_c = np.roll(try_right, 1, axis=1)
+        left_wins = priority > np.roll(priority, 1, axis=1)
+        grant_left = try_left & free & ~(right_on_c & ~left_wins)
+        grant_right = np.roll(right_on_c & free & ~(try_left & left_wins), -1, axis=1)
+
+        failed_left = try_left & ~grant_left
+        failed_right = try_right & ~grant_right
+        failures += failed_left
+        failures += failed_right
+        waited += failed_right
+        give_up = failed_right & (waited > wait_limit)
+        np.maximum(max_hunger, (hunger * grant_right).max(axis=1), out=max_hunger)
+        hunger *= ~grant_right
+        waited *= ~(grant_right | give_up)
+
+        hungry &= ~grant_left
+        hungry |= became_hungry | give_up
+        has_left &= ~(grant_right | give_up)
+        has_left |= grant_left
+        eating |= grant_right
+        hunger += hungry | has_left
+
+        all_done = (meals == 0).all(axis=1)
+        if forever:
+            leaving = (all_done | (has_left & (waited > 0)).all(axis=1)) & live
+        else:
+            leaving = all_done & live
+        if leaving.any():
+            out = rows[leaving]
+            steps[out] = np.where(all_done[leaving], step, -1)
+            deadlocked[out] = ~all_done[leaving]
+            # Philosophers still hungry when the table stops count too, or
+            # deadlocked and unfinished tables would look well fed.
+            out_max_hunger[out] = np.maximum(max_hunger[leaving], hunger[leaving].max(axis=1))
+            out_failures[out] = failures[leaving].sum(axis=1)
+            live &= ~leaving
+            remaining = np.count_nonzero(live)
+            if remaining == 0:
+                break
+            if remaining <= width // 2:
+                keep = live
+                rows, live, max_hunger = rows[keep], live[keep], max_hunger[keep]
+                thinking, hungry, has_left, eating, waited, hunger, failures, meals = (
+                    np.asfortranarray(array[keep])
+                    for array in (thinking, hungry, has_left, eating, waited, hunger, failures, meals))
+    else:
+        out_max_hunger[rows[live]] = np.maximum(max_hunger[live], hunger[live].max(axis=1))
+        out_failures[rows[live]] = failures[live].sum(axis=1)
+    return Trials(steps, deadlocked, out_max_hunger, out_failures, n, meal_size)
+
+
+def simulate_python(tables, n, meal_size=9, protocol="lock", think=0.2, eat=0.2, pickup=0.5, retry=0.5,
+                    timeout=10, max_steps=100_000, seed=None) -> Trials:
+    """The same rules as ``simulate``, one table and one philosopher at a time."""
+    wait_limit = _wait_limit(protocol, timeout)
+    rng = random.Random(seed)
+    steps, deadlocked, max_hungers, failure_counts = [], [], [], []
+    for _ in range(tables):
+        phase = [THINKING] * n
+        held_left = [False] * n
+        held_right = [False] * n
+        waited = [0] * n
+        hunger = [0] * n
+        meals = [meal_size] * n
+        max_hunger = 0
+        failures = 0
+        result = -1
+        stuck = False
+        for step in range(1, max_steps + 1):
+            draw = [rng.random() for _ in range(n)]
+            priority = [rng.random() for _ in range(n)]
+            start = list(phase)
+            for i in range(n):
+                if start[i] == EATING and draw[i] < eat:
+                    meals[i] -= 1
+                    held_left[i] = held_right[i] = False
+                    phase[i] = THINKING if meals[i] > 0 else DONE
+                elif start[i] == THINKING and draw[i] < think:
+                    phase[i] = HUNGRY
+            free = [not (held_left[c] or held_right[c - 1]) for c in range(n)]
+            try_left = [start[i] == HUNGRY and draw[i] < retry for i in range(n)]
+            try_right = [start[i] == HAS_LEFT and (waited[i] > 0 or draw[i] < pickup) for i in range(n)]
+            for c in range(n):
+                left, right = try_left[c], try_right[c - 1]
+                if not free[c] or not (left or right):
+                    continue
+                if left and (not right or priority[c] > priority[c - 1]):
+                    held_left[c] = True
+                    phase[c] = HAS_LEFT
+                    try_left[c] = False
+                else:
+                    i = (c - 1) % n
+                    held_right[i] = True
+                    phase[i] = EATING
+                    max_hunger = max(max_hunger, hunger[i])
+                    hunger[i] = waited[i] = 0
+                    try_right[i] = False
+            for i in range(n):
+                if try_left[i]:
+                    failures += 1
+                if try_right[i]:
+                    failures += 1
+                    waited[i] += 1
+                    if wait_limit is not None and waited[i] > wait_limit:
+                        held_left[i] = False
+                        phase[i] = HUNGRY
+                        waited[i] = 0
+                if phase[i] in (HUNGRY, HAS_LEFT):
+                    hunger[i] += 1
+            if all(p == DONE for p in phase):
+                result = step
+                break
+            if wait_limit is None and all(held_left[i] and waited[i] > 0 for i in range(n)):
+                stuck = True
+                break
+        steps.append(result)
+        deadlocked.append(stuck)
+        max_hungers.append(max(max_hunger, max(hunger)))
+        failure_counts.append(failures)
+    return Trials(steps, deadlocked, max_hungers, failure_counts, n, meal_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate throughput and starvation over many independent tables.")
+    parser.add_argument("--tables", type=int, default=10_000)
+    parser.add_argument("--philosophers", type=int, default=5)
+    parser.add_argument("--meals", type=int, default=9)
+    parser.add_argument("--protocol", choices=["lock", "semaphore"], default="lock")
+    parser.add_argument("--timeout", type=int, default=10, help="semaphore wait in ticks, -1 for forever")
+    parser.add_argument("--hunger-threshold", type=int, default=100)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    trials = simulate(args.tables, args.philosophers, args.meals, args.protocol,
+                      timeout=None if args.timeout < 0 else args.timeout, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{len(trials)} tables in {elapsed:.2f}s ({len(trials) / elapsed:.0f} tables/s)")
+    for name, value in trials.summary(args.hunger_threshold).items():
+        if isinstance(value, tuple):
+            print(f"  {name:<24}{value[0]:>12.4f}  [{value[1]:.4f}, {value[2]:.4f}]")
+        else:
+            print(f"  {name:<24}{value:>12}")
+
+
+if __name__ == "__main__":
+    main()
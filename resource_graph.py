@@ -0,0 +1,192 @@
+"""Resource-conflict graphs for the drinking philosophers generalisation.
+
+A ``ResourceGraph`` records which shared resources (chopsticks, bottles) every
+philosopher needs before it can eat. Both directions are kept as CSR arrays:
+``indptr``/``indices`` map a philosopher to its resources in acquisition order
+and ``users_indptr``/``users_indices`` map a resource back to the
+philosophers that contend for it. The classic table is just ``ring(n)``.
+"""
+from __future__ import annotations
+from array import array
+import random
+
+
+class ResourceGraph:
+    def __init__(self, number_of_philosophers, number_of_resources, indptr, indices,
+                 users_indptr=None, users_indices=None):
+        if len(indptr) != number_of_philosophers + 1:
+            raise ValueError("indptr must have number_of_philosophers + 1 entries")
+        if indptr[-1] != len(indices):
+            raise ValueError("indptr[-1] must equal the number of indices")
+        self.number_of_philosophers = number_of_philosophers
+        self.number_of_resources = number_of_resources
+        self.indptr = array('q', indptr)
+        self.indices = array('i', indices)
+        if users_indptr is None:
+            users_indptr, users_indices = _transpose(
+                number_of_philosophers, number_of_resources, self.indptr, self.indices)
+        self.users_indptr = array('q', users_indptr)
+        self.users_indices = array('i', users_indices)
+
+    @classmethod
+    def from_resource_sets(cls, resource_sets, number_of_resources=None) -> ResourceGraph:
+        """Builds a graph from one iterable of resource ids per philosopher, kept in the given order."""
+        indptr = array('q', [0])
+        indices = array('i')
+        for resources in resource_sets:
+            indices.extend(resources)
+            indptr.append(len(indices))
+        if number_of_resources is None:
+            number_of_resources = max(indices) + 1 if indices else 0
+        elif indices and max(indices) >= number_of_resources:
+            raise ValueError("resource id out of range")
+        return cls(len(indptr) - 1, number_of_resources, indptr, indices)
+
+    @classmethod
+    def from_edges(cls, number_of_philosophers, edges) -> ResourceGraph:
+        """Builds a graph where every conflict edge ``(u, v)`` is one resource shared by ``u`` and ``v``.
+
+        Each philosopher acquires its resources in ascending id order.
+        """
+        sources = array('i')
+        targets = array('i')
+        for u, v in edges:
+            sources.append(u)
+            targets.append(v)
+        number_of_resources = len(sources)
+        degree = array('q', bytes(8 * (number_of_philosophers + 1)))
+        for u in sources:
+            degree[u + 1] += 1
+        for v in targets:
+            degree[v + 1] += 1
+        for p in range(number_of_philosophers):
+            degree[p + 1] += degree[p]
+        indptr = degree
+        fill = array('q', indptr[:-1])
+        indices = array('i', bytes(4 * indptr[-1]))
+        # Resources are visited in ascending id order, so every row comes out sorted.
+        for resource in range(number_of_resources):
+            u = sources[resource]
+            indices[fill[u]] = resource
+            fill[u] += 1
+            v = targets[resource]
+            indices[fill[v]] = resource
+            fill[v] += 1
+        return cls(number_of_philosophers, number_of_resources, indptr, indices)
+
+    @property
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def resources(self, philosopher):
+        return self.indices[self.indptr[philosopher]:self.indptr[philosopher + 1]]
+
+    def users(self, resource):
+        return self.users_indices[self.users_indptr[resource]:self.users_indptr[resource + 1]]
+
+    def neighbors(self, philosopher):
+        """Returns the philosophers that share at least one resource with ``philosopher``."""
+        neighbors = set()
+        for resource in self.resources(philosopher):
+            neighbors.update(self.users(resource))
+        neighbors.discard(philosopher)
+        return neighbors
+
+    def __repr__(self) -> str:
+        return (f"ResourceGraph(philosophers={self.number_of_philosophers}, "
+                f"resources={self.number_of_resources}, edges={self.number_of_edges})")
+
+
+def _transpose(number_of_philosophers, number_of_resources, indptr, indices):
+    counts = array('q', bytes(8 * (number_of_resources + 1)))
+    for resource in indices:
+        counts[resource + 1] += 1
+    for r in range(number_of_resources):
+        counts[r + 1] += counts[r]
+    fill = array('q', counts[:-1])
+    users = array('i', bytes(4 * len(indices)))
+    for p in range(number_of_philosophers):
+        for k in range(indptr[p], indptr[p + 1]):
+            resource = indices[k]
+            users[fill[resource]] = p
+            fill[resource] += 1
+    return counts, users
+
+
+def ring(number_of_philosophers) -> ResourceGraph:
+    """The classic table: philosopher ``i`` takes chopstick ``i`` and then ``(i+1) % n``."""
+    n = number_of_philosophers
+    indptr = array('q', range(0, 2 * n + 1, 2))
+    indices = array('i', bytes(8 * n))
+    for i in range(n):
+        indices[2 * i] = i
+        indices[2 * i + 1] = (i + 1) % n
+    return ResourceGraph(n, n, indptr, indices)
+
+
+def grid(rows, columns, wrap=False) -> ResourceGraph:
+    """Philosophers on a ``rows x columns`` lattice sharing one resource per lattice edge."""
+    def edges():
+        for r in range(rows):
+            for c in range(columns):
+                p = r * columns + c
+                if c + 1 < columns:
+                    yield p, p + 1
+                elif wrap and columns > 2:
+                    yield p, r * columns
+                if r + 1 < rows:
+                    yield p, p + columns
+                elif wrap and rows > 2:
+                    yield p, c
+    return ResourceGraph.from_edges(rows * columns, edges())
+
+
+def random_regular(number_of_philosophers, degree, seed=None) -> ResourceGraph:
+    """Configuration-model graph where every philosopher has close to ``degree`` resources.
+
+    Stubs are paired uniformly at random and self-loops and duplicate pairs are
+    dropped, so a few philosophers may end up with slightly fewer resources.
+    """
+    if number_of_philosophers * degree % 2:
+        raise ValueError("number_of_philosophers * degree must be even")
+    rng = random.Random(seed)
+    stubs = array('i', (p for p in range(number_of_philosophers) for _ in range(degree)))
+    rng.shuffle(stubs)
+    seen = set()
+    edges = []
+    for k in range(0, len(stubs), 2):
+        u, v = stubs[k], stubs[k + 1]
+        if u == v:
+            continue
+        key = (u, v) if u < v else (v, u)
+        if key in seen:
+            continue
+        seen.add(key)
+        edges.append(key)
+    return ResourceGraph.from_edges(number_of_philosophers, edges)
+
+
+def power_law(number_of_philosophers, edges_per_philosopher=2, seed=None) -> ResourceGraph:
+    """Barabasi-Albert preferential attachment: a few hub philosophers share many resources."""
+    m = edges_per_philosopher
+    if m < 1 or m >= number_of_philosophers:
+        raise ValueError("edges_per_philosopher must be between 1 and number_of_philosophers - 1")
+    rng = random.Random(seed)
+    # Every endpoint is appended once per incident edge, so sampling uniformly
+    # from it picks philosophers proportionally to their degree.
+    endpoints = array('i')
+    edges = []
+    for p in range(m + 1):
+        for q in range(p):
+            edges.append((q, p))
+            endpoints.append(q)
+            endpoints.append(p)
+    for p in range(m + 1, number_of_philosophers):
+        targets = set()
+        while len(targets) < m:
+            targets.add(endpoints[rng.randrange(len(endpoints))])
+        for q in sorted(targets):
+            edges.append((q, p))
+            endpoints.append(q)
+            endpoints.append(p)
+    return ResourceGraph.from_edges(number_of_philosophers, edges)
@@ -0,0 +1,69 @@
+"""Starvation-aware arbitration of contested chopsticks.
+
+``HungerScheduler`` hands a philosopher all of its resources at once, and only
+when none of them is in use and no conflicting neighbour has been hungry
+noticeably longer. A neighbour's claim ages with its hunger: once it has
+waited ``patience`` seconds longer than you, you step aside for it. With
+``patience=0`` this is strict first-come first-served ticketing; larger values
+trade a looser bound on the tail hunger time for more throughput.
+"""
+from __future__ import annotations
+import threading
+import time
+
+from resource_graph import ResourceGraph
+
+
+class HungerScheduler:
+    def __init__(self, graph: ResourceGraph, patience=0.0):
+        self.graph = graph
+        self.patience = patience
+        self.lock = threading.Lock()
+        self.waiters = [threading.Condition(self.lock) for _ in range(graph.number_of_philosophers)]
+        self.in_use = bytearray(graph.number_of_resources)
+        # (hungry since, ticket) while a philosopher waits, None otherwise
+        self.claims = [None for _ in range(graph.number_of_philosophers)]
+        self.neighbors = [None for _ in range(graph.number_of_philosophers)]
+        self.next_ticket = 0
+
+    def _neighbors(self, i):
+        if self.neighbors[i] is None:
+            self.neighbors[i] = tuple(self.graph.neighbors(i))
+        return self.neighbors[i]
+
+    def _can_eat(self, i):
+        for resource in self.graph.resources(i):
+            if self.in_use[resource]:
+                return False
+        since, ticket = self.claims[i]
+        for q in self._neighbors(i):
+            claim = self.claims[q]
+            if claim is None:
+                continue
+            waited_longer = since - claim[0]
+            if waited_longer > self.patience or (waited_longer == self.patience and claim[1] < ticket):
+                return False
+        return True
+
+    def acquire(self, i):
+        """Blocks until philosopher ``i`` may take every resource it needs."""
+        with self.lock:
+            self.claims[i] = (time.monotonic(), self.next_ticket)
+            self.next_ticket += 1
+            while not self._can_eat(i):
+                self.waiters[i].wait()
+            self.claims[i] = None
+            for resource in self.graph.resources(i):
+                self.in_use[resource] = 1
+            self._wake_neighbors(i)
+
+    def release(self, i):
+        with self.lock:
+            for resource in self.graph.resources(i):
+                self.in_use[resource] = 0
+            self._wake_neighbors(i)
+
+    def _wake_neighbors(self, i):
+        for q in self._neighbors(i):
+            if self.claims[q] is not None:
+                self.waiters[q].notify()
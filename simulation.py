@@ -0,0 +1,453 @@
+"""Shared philosopher core behind the script tables and the pygame visualizer.
+
+``LockTable`` and ``SemaphoreTable`` run the protocols from ``w_lock.py`` and
+``w_semaphore.py`` over a ``ResourceGraph``. Instead of exposing fields for
+front ends to poll, every state change is published as an ``Event`` on an
+``EventBus``. The bus hands subscribers whole batches of events from a
+dispatcher thread, so a front end does work in proportion to what changed
+rather than to the number of philosophers.
+"""
+from __future__ import annotations
+from collections import deque
+from array import array
+from enum import Enum, IntEnum
+from threading import Lock, Semaphore
+from typing import NamedTuple, Optional
+import argparse
+import random
+import threading
+import time
+
+from backoff import POLICIES, FixedBackoff
+from checkpoint import Checkpoint
+from metrics import Metrics, MetricsServer
+from resource_graph import ring
+from scheduling import HungerScheduler
+
+
+class PhilosopherEvent(Enum):
+    HUNGRY = "hungry"
+    # The first resource a philosopher picks up is its left chopstick, every later one its right.
+    TOOK_LEFT = "took-left"
+    TOOK_RIGHT = "took-right"
+    EATING = "eating"
+    # Meal finished, everything held is put down.
+    DONE = "done"
+    # Gave up on a busy chopstick and put down everything held.
+    DROPPED = "dropped"
+
+
+class Event(NamedTuple):
+    time: float
+    philosopher: int
+    kind: PhilosopherEvent
+    chopstick: Optional[int] = None
+
+
+class EventBus:
+    """Collects events from philosopher threads and pushes them to subscribers in batches.
+
+    ``publish`` only appends to a deque. ``start`` runs a dispatcher thread that
+    wakes up when events arrive, waits at least ``interval`` seconds between
+    batches and calls every subscriber with the list of events since the last
+    batch. Without a dispatcher, ``flush`` delivers the pending batch in the
+    calling thread.
+    """
+
+    def __init__(self, interval=0.0):
+        self.interval = interval
+        self.subscribers = []
+        self.pending = deque()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.closed = False
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def publish(self, event: Event):
+        if self.subscribers:
+            self.pending.append(event)
+            self.wakeup.set()
+
+    def flush(self):
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        if batch:
+            for callback in self.subscribers:
+                callback(batch)
+        return len(batch)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._dispatch, daemon=True)
+        self.thread.start()
+        return self
+
+    def _dispatch(self):
+        while not self.closed:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            self.flush()
+            if self.interval:
+                time.sleep(self.interval)
+
+    def close(self, flush=True):
+        self.closed = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        if flush:
+            self.flush()
+        self.subscribers = []
+        self.pending.clear()
+
+
+class Phase(IntEnum):
+    THINKING = 0
+    HUNGRY = 1
+    # Holding some but not all of the resources it needs.
+    ACQUIRING = 2
+    EATING = 3
+    DONE = 4
+
+
+class DiningPhilosophers:
+    """Runs one philosopher per thread until its meals are gone or the table is stopped.
+
+    Subclasses decide what a chopstick is and how a philosopher tries to take
+    one. ``sleep`` and ``clock`` can be replaced to speed up or control time;
+    ``think_time``, ``pickup_time`` and ``eat_time`` return how long each
+    phase lasts and default to draws from the table's own ``rng``.
+
+    ``pause`` parks every philosopher at a point where it holds no chopstick
+    (about to think, or about to retry after backing off), which is where
+    ``checkpoint`` takes its snapshot and where ``restore`` picks up again.
+
+    Nothing here relies on the GIL. Each slot of ``meals`` and ``phases`` is
+    only written by its own philosopher's thread and only read by others
+    while the table is paused; chopsticks change hands through atomic lock
+    operations and the pause counters live under ``gate``.
+    """
+
+    def __init__(self, number_of_philosophers, meal_size=9, metrics=None, graph=None, scheduler=None,
+                 backoff=None, bus=None, sleep=time.sleep, clock=time.monotonic, seed=None,
+                 think_time=None, pickup_time=None, eat_time=None):
+        self.graph = graph if graph is not None else ring(number_of_philosophers)
+        if self.graph.number_of_philosophers != number_of_philosophers:
+            raise ValueError("graph does not match the number of philosophers")
+        self.number_of_philosophers = number_of_philosophers
+        self.meals = [meal_size for _ in range(number_of_philosophers)]
+        self.phases = bytearray(number_of_philosophers)
+        self.chopsticks = [self.new_chopstick(c) for c in range(self.graph.number_of_resources)]
+        self.metrics = metrics if metrics is not None else Metrics(number_of_philosophers)
+        self.scheduler = scheduler
+        self.backoff = backoff if backoff is not None else FixedBackoff()
+        self.bus = bus if bus is not None else EventBus()
+        self.sleep = sleep
+        self.clock = clock
+        self.epoch = clock()
+        self.rng = random.Random(seed)
+        self.think_time = think_time if think_time is not None else self.rng.random
+        self.pickup_time = pickup_time if pickup_time is not None else self.rng.random
+        self.eat_time = eat_time if eat_time is not None else self.rng.random
+        # Remaining eating time of philosophers restored mid-meal.
+        self.resumed_meals = {}
+        self.stopped = False
+        self.pause_requested = False
+        self.gate = threading.Condition()
+        self.running = 0
+        self.parked = 0
+
+    def new_chopstick(self, chopstick):
+        raise NotImplementedError
+
+    def take(self, i, chopstick) -> bool:
+        raise NotImplementedError
+
+    def now(self):
+        """Seconds of simulated time, carried over across checkpoints."""
+        return self.clock() - self.epoch
+
+    def stop(self):
+        self.stopped = True
+        self.resume()
+
+    def publish(self, i, kind, chopstick=None):
+        self.bus.publish(Event(self.now(), i, kind, chopstick))
+
+    def pause(self, timeout=None) -> bool:
+        """Asks every philosopher to park and waits until all running ones have."""
+        with self.gate:
+            self.pause_requested = True
+            return self.gate.wait_for(lambda: self.parked == self.running, timeout)
+
+    def resume(self):
+        with self.gate:
+            self.pause_requested = False
+            self.gate.notify_all()
+
+    def _safe_point(self, i, phase):
+        self.phases[i] = phase
+        if not self.pause_requested:
+            return
+        with self.gate:
+            self.parked += 1
+            self.gate.notify_all()
+            while self.pause_requested:
+                self.gate.wait()
+            self.parked -= 1
+
+    def checkpoint(self) -> Checkpoint:
+        """Pauses the table, snapshots it and lets it carry on.
+
+        Paused philosophers hold no chopsticks and are all due now: hungry
+        ones retry straight away and thinking ones have yet to draw how long
+        they think, which ``Engine.from_checkpoint`` does on resume.
+        """
+        self.pause()
+        try:
+            # Read once: wake must equal clock exactly for the resume to see them as due.
+            now = self.now()
+            holders = array('i', [-1]) * self.graph.number_of_resources
+            return Checkpoint(now, array('i', self.meals), self.phases,
+                              array('i', bytes(4 * self.number_of_philosophers)), holders,
+                              array('d', [now]) * self.number_of_philosophers,
+                              self.rng.getstate(), self.graph)
+        finally:
+            self.resume()
+
+    def restore(self, checkpoint: Checkpoint):
+        """Loads a checkpoint into a table whose philosophers have not started yet.
+
+        Philosophers caught half way through picking up chopsticks put them
+        down and are hungry again; those caught eating keep their chopsticks
+        and finish the rest of the meal.
+        """
+        if checkpoint.number_of_philosophers != self.number_of_philosophers:
+            raise ValueError("checkpoint is for a different number of philosophers")
+        graph = checkpoint.graph
+        if (graph.number_of_resources != self.graph.number_of_resources or graph.indptr != self.graph.indptr
+                or graph.indices != self.graph.indices):
+            raise ValueError("checkpoint is for a different resource graph")
+        self.epoch = self.clock() - checkpoint.clock
+        self.meals = list(checkpoint.meals)
+        self.rng.setstate(checkpoint.rng_state)
+        for i, phase in enumerate(checkpoint.phases):
+            if phase == Phase.ACQUIRING:
+                phase = Phase.HUNGRY
+            elif phase == Phase.EATING:
+                for c in self.graph.resources(i):
+                    if not self.chopsticks[c].acquire(blocking=False):
+                        raise ValueError(f"chopstick {c} is held by more than one eating philosopher")
+                self.resumed_meals[i] = max(0.0, checkpoint.wake[i] - checkpoint.clock)
+            self.phases[i] = phase
+
+    def philosopher(self, i):
+        needed = self.graph.resources(i)
+        with self.gate:
+            self.running += 1
+        try:
+            if self.phases[i] == Phase.EATING:
+                self._eat(i, list(needed))
+            while self.meals[i] > 0 and not self.stopped:
+                if self.phases[i] != Phase.HUNGRY:
+                    self._safe_point(i, Phase.THINKING)
+                    self.sleep(self.think_time())
+                    self.phases[i] = Phase.HUNGRY
+                    self.publish(i, PhilosopherEvent.HUNGRY)
+                    self.metrics.hungry(i)
+                if self.scheduler is not None:
+                    self.scheduler.acquire(i)
+                ate = False
+                while not ate and not self.stopped:
+                    held = []
+                    busy = None
+                    for c in needed:
+                        if not self.take(i, c):
+                            busy = c
+                            break
+                        self.metrics.acquire_attempt(i, c, True)
+                        self.backoff.succeeded(i, c)
+                        held.append(c)
+                        self.publish(i, PhilosopherEvent.TOOK_LEFT if len(held) == 1 else PhilosopherEvent.TOOK_RIGHT, c)
+                        if len(held) < len(needed):
+                            self.phases[i] = Phase.ACQUIRING
+                            self.sleep(self.pickup_time())
+                    if busy is None:
+                        ate = self._eat(i, held)
+                        continue
+                    if held:
+                        self.publish(i, PhilosopherEvent.DROPPED)
+                    for c in reversed(held):
+                        self.chopsticks[c].release()
+                    self.metrics.acquire_attempt(i, busy, False)
+                    self.sleep(self.backoff.failed(i, busy))
+                    self._safe_point(i, Phase.HUNGRY)
+                if self.scheduler is not None:
+                    self.scheduler.release(i)
+        finally:
+            with self.gate:
+                if self.meals[i] == 0:
+                    self.phases[i] = Phase.DONE
+                self.running -= 1
+                self.gate.notify_all()
+
+    def _eat(self, i, held):
+        self.phases[i] = Phase.EATING
+        self.backoff.reset(i)
+        self.metrics.start_eating(i)
+        self.publish(i, PhilosopherEvent.EATING)
+        remaining = self.resumed_meals.pop(i, None)
+        self.sleep(self.eat_time() if remaining is None else remaining)
+        self.meals[i] -= 1
+        self.metrics.meal_completed(i)
+        # Published, and the phase left, before the release so nobody is seen
+        # eating without its chopsticks or taking one still held.
+        self.publish(i, PhilosopherEvent.DONE)
+        self.phases[i] = Phase.THINKING
+        for c in reversed(held):
+            self.chopsticks[c].release()
+        return True
+
+
+class LockTable(DiningPhilosophers):
+    """The ``w_lock`` protocol: take a chopstick if it is free, otherwise give up on it."""
+
+    def new_chopstick(self, chopstick):
+        return Lock()
+
+    def take(self, i, chopstick):
+        # One atomic try-lock; checking locked() first left a window in which
+        # a neighbour could take the chopstick and this thread would block.
+        return self.chopsticks[chopstick].acquire(blocking=False)
+
+
+class SemaphoreTable(DiningPhilosophers):
+    """The ``w_semaphore`` protocol: wait on a chopstick for at most the policy's timeout."""
+
+    def new_chopstick(self, chopstick):
+        return Semaphore(value=1)
+
+    def take(self, i, chopstick):
+        return self.chopsticks[chopstick].acquire(timeout=self.backoff.acquire_timeout(i, chopstick))
+
+
+class TerminalMonitor:
+    """Prints the table the way the scripts always did, kept up to date from event batches."""
+
+    def __init__(self, table: DiningPhilosophers, out=print):
+        n = table.number_of_philosophers
+        self.out = out
+        self.status = ['  _  ' if phase == Phase.HUNGRY else '  T  ' for phase in table.phases]
+        self.chopstick_holders = ['     ' for _ in range(n)]
+        self.meals = list(table.meals)
+        self.meals_left = sum(self.meals)
+        self.eating = 0
+
+    def __call__(self, batch):
+        for event in batch:
+            i = event.philosopher
+            if event.kind is PhilosopherEvent.HUNGRY:
+                self.status[i] = '  _  '
+            elif event.kind is PhilosopherEvent.TOOK_LEFT:
+                self.chopstick_holders[i] = ' /   '
+            elif event.kind is PhilosopherEvent.TOOK_RIGHT:
+                self.chopstick_holders[i] = ' / \\ '
+            elif event.kind is PhilosopherEvent.EATING:
+                self.status[i] = '  E  '
+                self.eating += 1
+            elif event.kind is PhilosopherEvent.DONE:
+                self.status[i] = '  T  '
+                self.chopstick_holders[i] = '     '
+                self.meals[i] -= 1
+                self.meals_left -= 1
+                self.eating -= 1
+            elif event.kind is PhilosopherEvent.DROPPED:
+                self.chopstick_holders[i] = '     '
+        self.print()
+
+    def print(self):
+        self.out("=" * (len(self.status) * 5))
+        self.out("".join(self.status) + "  :  " + str(self.eating))
+        self.out("".join(self.chopstick_holders))
+        self.out("".join("{:3d}  ".format(m) for m in self.meals) + "  :  " + str(self.meals_left))
+
+
+class Recorder:
+    """Writes every event to a text log as ``time philosopher event chopstick`` lines."""
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def __call__(self, batch):
+        self.file.write("".join(
+            f"{e.time:.6f} {e.philosopher} {e.kind.value} {'-' if e.chopstick is None else e.chopstick}\n"
+            for e in batch))
+
+    def close(self):
+        self.file.close()
+
+
+_KINDS = {kind.value: kind for kind in PhilosopherEvent}
+
+
+def parse_events(lines):
+    """Yields the events of ``Recorder`` lines from any iterable of them, such as an open log or stdin."""
+    kinds = _KINDS
+    for line in lines:
+        t, philosopher, kind, chopstick = line.split()
+        yield Event(float(t), int(philosopher), kinds[kind], None if chopstick == '-' else int(chopstick))
+
+
+def read_events(path):
+    """Yields the events of a log written by ``Recorder`` one at a time."""
+    with open(path) as file:
+        yield from parse_events(file)
+
+
+def run_script(table_class, number_of_philosophers, meal_size):
+    """The command line front end shared by ``w_lock.py`` and ``w_semaphore.py``."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on localhost at this port")
+    parser.add_argument("--fair", action="store_true", help="grant contested chopsticks to the hungriest philosopher")
+    parser.add_argument("--patience", type=float, default=0.0,
+                        help="with --fair, how much longer a neighbour must have waited before you step aside")
+    parser.add_argument("--backoff", choices=sorted(POLICIES), default="fixed",
+                        help="how long to wait before retrying a busy chopstick")
+    parser.add_argument("--record", metavar="PATH", help="write every state change to an event log")
+    parser.add_argument("--checkpoint", metavar="PATH", help="periodically save the table to this file")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0, help="seconds between checkpoints")
+    parser.add_argument("--resume", metavar="PATH", help="continue from a checkpoint")
+    args = parser.parse_args()
+    n = number_of_philosophers
+    bus = EventBus(interval=0.1)
+    dining_philosophers = table_class(n, meal_size, backoff=POLICIES[args.backoff](), bus=bus)
+    if args.fair:
+        dining_philosophers.scheduler = HungerScheduler(dining_philosophers.graph, args.patience)
+    if args.resume:
+        dining_philosophers.restore(Checkpoint.load(args.resume))
+    bus.subscribe(TerminalMonitor(dining_philosophers))
+    recorder = None
+    if args.record:
+        recorder = bus.subscribe(Recorder(args.record))
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(dining_philosophers.metrics, args.metrics_port).start()
+    bus.start()
+    philosophers = [threading.Thread(target=dining_philosophers.philosopher, args=(i,)) for i in range(n)]
+    for philosopher in philosophers:
+        philosopher.start()
+    for philosopher in philosophers:
+        while philosopher.is_alive():
+            philosopher.join(timeout=args.checkpoint_interval if args.checkpoint else None)
+            if args.checkpoint and philosopher.is_alive():
+                dining_philosophers.checkpoint().save(args.checkpoint)
+    bus.close()
+    if recorder is not None:
+        recorder.close()
+    if metrics_server is not None:
+        metrics_server.stop()
+    print("hunger seconds p50/p90/p99/max:",
+          " / ".join("{:.2f}".format(t) for t in dining_philosophers.metrics.hunger_percentiles().values()))
@@ -0,0 +1,224 @@
+"""Single-pass analysis of event logs written by ``Recorder``.
+
+``TraceAnalyzer`` keeps a few numbers per philosopher and per chopstick and
+nothing per event, so memory stays the same however long the log is. Every
+interval is settled lazily: when an event changes a philosopher or a
+chopstick, the time since its previous change is credited to whatever state
+it was in. From that it reports:
+
+* concurrency over time: how long the table spent with k philosophers eating,
+  against the floor(N/2) a ring allows, and optionally the mean per window;
+* idle-fork time: a chopstick lying on the table while one of its users is hungry;
+* blocked-holding time: a hungry philosopher sitting on some of its chopsticks;
+* held-while-eating time: chopsticks tied up for a whole meal;
+* critical-path attribution: how long each philosopher held a chopstick
+  that a hungry neighbour was waiting for, i.e. how much of everybody
+  else's waiting ran through it.
+"""
+from __future__ import annotations
+from array import array
+import argparse
+import sys
+
+from resource_graph import ResourceGraph, ring
+from simulation import Phase, PhilosopherEvent, parse_events
+
+
+class TraceAnalyzer:
+    """Consumes events in time order; ``on_window(start, mean, peak)`` is called as each window closes."""
+
+    def __init__(self, graph: ResourceGraph, window=None, on_window=None, bound=None):
+        n = graph.number_of_philosophers
+        self.graph = graph
+        self.bound = bound if bound is not None else n // 2
+        self.events = 0
+        self.start = None
+        self.now = 0.0
+        self.eating = 0
+        self.concurrency = array('d', bytes(8 * (n + 1)))
+
+        self.phases = bytearray(n)
+        self.held = array('i', bytes(4 * n))
+        self.since = array('d', bytes(8 * n))
+        self.meals = array('i', bytes(4 * n))
+        self.hungry_time = array('d', bytes(8 * n))
+        self.blocked_holding = array('d', bytes(8 * n))
+        self.eating_time = array('d', bytes(8 * n))
+        self.blocking = array('d', bytes(8 * n))
+
+        resources = graph.number_of_resources
+        self.holders = array('i', [-1]) * resources
+        self.hungry_users = array('i', bytes(4 * resources))
+        self.chopstick_since = array('d', bytes(8 * resources))
+        self.idle = array('d', bytes(8 * resources))
+
+        self.window = window
+        self.on_window = on_window
+        self.window_end = None
+        self.window_area = 0.0
+        self.window_peak = 0
+
+    def _advance(self, t):
+        if self.start is None:
+            # Logs start wherever the clock was, which for a resumed run is
+            # well past zero; nothing before the first event is counted.
+            self.start = self.now = t
+            self.window_end = t + self.window if self.window else None
+            for i in range(self.graph.number_of_philosophers):
+                self.since[i] = t
+            for c in range(self.graph.number_of_resources):
+                self.chopstick_since[c] = t
+        elif self.window_end is not None:
+            while t >= self.window_end:
+                self.window_area += self.eating * (self.window_end - self.now)
+                self.concurrency[self.eating] += self.window_end - self.now
+                self.now = self.window_end
+                self.on_window(self.window_end - self.window, self.window_area / self.window, self.window_peak)
+                self.window_end += self.window
+                self.window_area = 0.0
+                self.window_peak = self.eating
+        dt = t - self.now
+        if self.window_end is not None:
+            self.window_area += self.eating * dt
+        self.concurrency[self.eating] += dt
+        self.now = t
+
+    def _settle_philosopher(self, i, t):
+        dt = t - self.since[i]
+        phase = self.phases[i]
+        if phase == Phase.EATING:
+            self.eating_time[i] += dt
+        elif phase == Phase.HUNGRY:
+            self.hungry_time[i] += dt
+            if self.held[i]:
+                self.blocked_holding[i] += dt
+        self.since[i] = t
+
+    def _settle_chopstick(self, c, t):
+        dt = t - self.chopstick_since[c]
+        holder = self.holders[c]
+        waiting = self.hungry_users[c]
+        if holder == -1:
+            if waiting:
+                self.idle[c] += dt
+        elif waiting > (self.phases[holder] == Phase.HUNGRY):
+            self.blocking[holder] += dt
+        self.chopstick_since[c] = t
+
+    def feed(self, t, i, kind, chopstick=None):
+        self.events += 1
+        self._advance(t)
+        self._settle_philosopher(i, t)
+        graph = self.graph
+        resources = graph.indices[graph.indptr[i]:graph.indptr[i + 1]]
+        if kind is PhilosopherEvent.TOOK_LEFT or kind is PhilosopherEvent.TOOK_RIGHT:
+            self._settle_chopstick(chopstick, t)
+            self.holders[chopstick] = i
+            self.held[i] += 1
+            return
+        for c in resources:
+            self._settle_chopstick(c, t)
+        if kind is PhilosopherEvent.HUNGRY:
+            if self.phases[i] != Phase.HUNGRY:
+                self.phases[i] = Phase.HUNGRY
+                for c in resources:
+                    self.hungry_users[c] += 1
+        elif kind is PhilosopherEvent.EATING:
+            if self.phases[i] == Phase.HUNGRY:
+                for c in resources:
+                    self.hungry_users[c] -= 1
+            self.phases[i] = Phase.EATING
+            self.eating += 1
+            if self.eating > self.window_peak:
+                self.window_peak = self.eating
+        else:
+            # DONE puts everything down after a meal, DROPPED after giving up.
+            for c in resources:
+                if self.holders[c] == i:
+                    self.holders[c] = -1
+            self.held[i] = 0
+            if kind is PhilosopherEvent.DONE:
+                if self.phases[i] == Phase.EATING:
+                    self.eating -= 1
+                self.phases[i] = Phase.THINKING
+                self.meals[i] += 1
+
+    def finish(self, t=None):
+        """Closes every open interval at ``t`` (the last event by default)."""
+        t = self.now if t is None else t
+        self._advance(t)
+        for i in range(self.graph.number_of_philosophers):
+            self._settle_philosopher(i, t)
+        for c in range(self.graph.number_of_resources):
+            self._settle_chopstick(c, t)
+        if self.window_end is not None and t > self.window_end - self.window:
+            elapsed = t - (self.window_end - self.window)
+            self.on_window(self.window_end - self.window, self.window_area / elapsed, self.window_peak)
+            self.window_end = None
+
+    @property
+    def duration(self):
+        return 0.0 if self.start is None else self.now - self.start
+
+    def report(self, out=print, top=None):
+        """Prints the summary; ``top`` limits the table to the philosophers blocking others the longest."""
+        duration = self.duration
+        mean = sum(k * seconds for k, seconds in enumerate(self.concurrency)) / duration if duration else 0.0
+        out(f"{self.events} events over {duration:.2f}s")
+        out(f"concurrency: {mean:.2f} eating on average, at most {self.bound} possible "
+            f"({mean / self.bound:.0%} of the bound)" if self.bound else f"concurrency: {mean:.2f} eating on average")
+        # Large tables get the levels they reached grouped into at most 16 rows.
+        reached = max((k for k, seconds in enumerate(self.concurrency) if seconds), default=0) + 1
+        width = -(-reached // 16)
+        for low in range(0, reached, width):
+            seconds = sum(self.concurrency[low:low + width])
+            if seconds:
+                levels = f"{low}" if width == 1 else f"{low}-{min(low + width, reached) - 1}"
+                out(f"  {levels:>9} eating {seconds:>12.2f}s {seconds / duration:>7.1%}")
+        idle = sum(self.idle)
+        chopstick_time = duration * self.graph.number_of_resources
+        out(f"idle forks: {idle:.2f} chopstick-seconds free while a user was hungry"
+            f" ({idle / chopstick_time if chopstick_time else 0:.1%} of all chopstick time)")
+        out(f"{'philosopher':>11}{'meals':>7}{'hungry s':>11}{'blocked holding s':>19}"
+            f"{'held eating s':>15}{'blocking others s':>19}")
+        philosophers = range(self.graph.number_of_philosophers)
+        if top is not None:
+            philosophers = sorted(philosophers, key=self.blocking.__getitem__, reverse=True)[:top]
+        for i in philosophers:
+            out(f"{i:>11}{self.meals[i]:>7}{self.hungry_time[i]:>11.2f}{self.blocked_holding[i]:>19.2f}"
+                f"{self.eating_time[i]:>15.2f}{self.blocking[i]:>19.2f}")
+
+
+def analyze(lines, analyzer: TraceAnalyzer):
+    """Feeds ``Recorder`` lines to ``analyzer`` and finishes it."""
+    feed = analyzer.feed
+    for t, philosopher, kind, chopstick in parse_events(lines):
+        feed(t, philosopher, kind, chopstick)
+    analyzer.finish()
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise an event log written with --record.")
+    parser.add_argument("log", help="event log, or - for standard input")
+    parser.add_argument("--philosophers", type=int, required=True, help="size of the ring the log was recorded on")
+    parser.add_argument("--window", type=float, help="also print the mean concurrency of every window of this many seconds")
+    parser.add_argument("--top", type=int, help="only list the philosophers that blocked others the longest")
+    args = parser.parse_args()
+
+    if args.window:
+        def on_window(start, mean, peak):
+            print(f"window {start:>12.2f}s  mean {mean:>6.2f}  peak {peak}")
+    else:
+        on_window = None
+    analyzer = TraceAnalyzer(ring(args.philosophers), args.window, on_window)
+    if args.log == "-":
+        analyze(sys.stdin, analyzer)
+    else:
+        with open(args.log) as file:
+            analyze(file, analyzer)
+    analyzer.report(top=args.top)
+
+
+if __name__ == "__main__":
+    main()